@@ -6,7 +6,7 @@ import sys
 from pathlib import Path
 
 import onnxruntime
-from PySide6.QtCore import QObject, QSettings, Qt, QThread, Signal
+from PySide6.QtCore import QObject, Qt, QThread, Signal
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import (
     QFileDialog,
@@ -18,9 +18,11 @@ from PySide6.QtWidgets import (
 )
 
 from backend.qtworkers import IndexWorker, SearchWorker
+from backend.watcher import FolderWatcher
 from MainWindow_ui import Ui_MainWindow
 from ResultList import ResultListWidget
 from SettingsWindow import SettingsWindow
+from settings import load_settings
 
 
 class QLogSignal(QObject):
@@ -63,6 +65,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         self.pushButton_folder_browse.clicked.connect(self.browse_folder)
         self.pushButton_index.clicked.connect(self.index_folder)
+        self.pushButton_watch.toggled.connect(self.watch_folder)
         self.pushButton_search.clicked.connect(self.search)
 
         self.lineEdit_folder.textChanged.connect(self.lineEdit_folder_textChanged)
@@ -78,15 +81,25 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.frame.setLayout(self.list_layout)
 
         self.pushButton_index.setEnabled(False)
+        self.pushButton_watch.setEnabled(False)
         self.pushButton_search.setEnabled(False)
 
+        self.watcher = None
+        # changes of the watched folder waiting to be indexed
+        self.watch_directories = set()
+        self.watch_rescan = False
+
         self.update_settings()
 
     def lineEdit_folder_textChanged(self, text):
+        # the watch is for the previous folder
+        self.pushButton_watch.setChecked(False)
         if text:
             self.pushButton_index.setEnabled(True)
+            self.pushButton_watch.setEnabled(True)
         else:
             self.pushButton_index.setEnabled(False)
+            self.pushButton_watch.setEnabled(False)
         self.folder_path = Path(text)
         self.db_path = self.folder_path / "PicFinder.db"
         self.result_list_widget.update_folder(self.folder_path)
@@ -129,22 +142,102 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.update_settings()
         if self.folder_path.exists() and self.folder_path.is_dir():
             self.result_list_widget.update_folder(self.folder_path)
-            self.index_worker = IndexWorker(self.folder_path, **self.settings)
-            self.index_worker_thread = QThread()
-            self.index_worker.moveToThread(self.index_worker_thread)
-            self.index_worker_thread.started.connect(self.index_worker.run)
-            self.index_worker.finished.connect(self.index_finished)
-            self.index_worker.finished.connect(self.index_worker_thread.quit)
-            self.index_worker.finished.connect(self.index_worker.deleteLater)
-            self.index_worker_thread.finished.connect(
-                self.index_worker_thread.deleteLater
-            )
-            self.index_worker.progress.connect(self.index_progress)
-            self.index_worker_thread.start()
+            self.start_index_worker(self.settings)
             self.statusbar.showMessage("Indexing...")
         else:
             self.statusbar.showMessage("Invalid Folder Path")
 
+    def start_index_worker(self, settings: dict):
+        self.index_worker = IndexWorker(self.folder_path, **settings)
+        self.index_worker_thread = QThread()
+        self.index_worker.moveToThread(self.index_worker_thread)
+        self.index_worker_thread.started.connect(self.index_worker.run)
+        self.index_worker.finished.connect(self.index_finished)
+        self.index_worker.finished.connect(self.index_worker_thread.quit)
+        self.index_worker.finished.connect(self.index_worker.deleteLater)
+        self.index_worker_thread.finished.connect(self.worker_thread_finished)
+        self.index_worker_thread.finished.connect(self.index_worker_thread.deleteLater)
+        self.index_worker.progress.connect(self.index_progress)
+        self.index_worker_thread.start()
+
+    def watch_folder(self, checked: bool):
+        if checked:
+            self.start_watching()
+        else:
+            self.stop_watching()
+
+    def start_watching(self):
+        self.update_settings()
+        if not (self.folder_path.exists() and self.folder_path.is_dir()):
+            self.statusbar.showMessage("Invalid Folder Path")
+            self.pushButton_watch.setChecked(False)
+            return
+        self.watcher = FolderWatcher(
+            self.folder_path,
+            self.settings["watch_polling"],
+            self.settings["watch_poll_interval"],
+        )
+        self.watcher_thread = QThread()
+        self.watcher.moveToThread(self.watcher_thread)
+        self.watcher_thread.started.connect(self.watcher.run)
+        self.watcher.changed.connect(self.folder_changed)
+        self.watcher.rescan.connect(self.folder_rescan)
+        self.watcher_thread.finished.connect(self.watcher.deleteLater)
+        self.watcher_thread.finished.connect(self.watcher_thread.deleteLater)
+        self.watcher_thread.start()
+        self.statusbar.showMessage(f"Watching {self.folder_path.as_posix()}")
+        # catch up with the changes made while not watching
+        self.folder_rescan()
+
+    def stop_watching(self):
+        if self.watcher is None:
+            return
+        self.watcher_thread.quit()
+        self.watcher_thread.wait()
+        self.watcher = None
+        self.watch_directories.clear()
+        self.watch_rescan = False
+        self.statusbar.showMessage("Stopped Watching")
+
+    def folder_changed(self, directories: list):
+        self.watch_directories.update(directories)
+        self.index_watched()
+
+    def folder_rescan(self):
+        self.watch_rescan = True
+        self.index_watched()
+
+    def index_watched(self):
+        """
+        Indexes the changes of the watched folder, once the running index or
+        search is done.
+        """
+        if self.watcher is None:
+            return
+        if not self.watch_rescan and not self.watch_directories:
+            return
+        try:
+            if self.index_worker_thread.isRunning():
+                return
+        except:
+            pass
+        try:
+            if self.search_worker_thread.isRunning():
+                return
+        except:
+            pass
+        settings = {**self.settings, "FullUpdate": False}
+        if not self.watch_rescan:
+            settings["scan_directories"] = sorted(self.watch_directories)
+        self.watch_directories.clear()
+        self.watch_rescan = False
+        self.start_index_worker(settings)
+
+    def worker_thread_finished(self):
+        # changes that came while the thread was running
+        self.sender().wait()
+        self.index_watched()
+
     def index_progress(self, value):
         self.statusbar.showMessage(f"Indexing... {value}")
 
@@ -174,6 +267,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.search_worker.finished.connect(self.search_finished)
             self.search_worker.finished.connect(self.search_worker_thread.quit)
             self.search_worker.finished.connect(self.search_worker.deleteLater)
+            self.search_worker_thread.finished.connect(self.worker_thread_finished)
             self.search_worker_thread.finished.connect(
                 self.search_worker_thread.deleteLater
             )
@@ -197,29 +291,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.settings_window.show()
 
     def update_settings(self):
-        settings = QSettings("HAL9000COM", "PicFinder")
-        self.settings = {}
-        self.settings["classification_model"] = settings.value(
-            "classification_model", "YOLO11n"
-        )
-        self.settings["classification_threshold"] = float(
-            settings.value("classification_threshold", 0.7)
-        )
-        self.settings["object_detection_model"] = settings.value(
-            "object_detection_model", "YOLO11n"
-        )
-        self.settings["object_detection_dataset"] = settings.value(
-            "object_detection_dataset", ["COCO"]
-        )
-        self.settings["object_detection_conf_threshold"] = float(
-            settings.value("object_detection_conf_threshold", 0.7)
-        )
-        self.settings["object_detection_iou_threshold"] = float(
-            settings.value("object_detection_iou_threshold", 0.5)
-        )
-        self.settings["OCR_model"] = settings.value("OCR_model", "RapidOCR")
-        self.settings["FullUpdate"] = settings.value("FullUpdate", False, type=bool)
-        self.settings["batch_size"] = int(settings.value("batch_size", 100))
+        self.settings = load_settings()
 
     def open_about(self):
         self.about_window = AboutWindow()
@@ -275,6 +347,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             else:
                 event.ignore()
 
+    def closeEvent(self, event):
+        self.stop_watching()
+        super(MainWindow, self).closeEvent(event)
+
 
 class AboutWindow(QWidget):
 
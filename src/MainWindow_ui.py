@@ -60,6 +60,12 @@ class Ui_MainWindow(object):
 
         self.horizontalLayout.addWidget(self.pushButton_index)
 
+        self.pushButton_watch = QPushButton(self.centralwidget)
+        self.pushButton_watch.setObjectName(u"pushButton_watch")
+        self.pushButton_watch.setCheckable(True)
+
+        self.horizontalLayout.addWidget(self.pushButton_watch)
+
 
         self.verticalLayout.addLayout(self.horizontalLayout)
 
@@ -118,6 +124,10 @@ class Ui_MainWindow(object):
         self.label_2.setText(QCoreApplication.translate("MainWindow", u"Folder:", None))
         self.pushButton_folder_browse.setText(QCoreApplication.translate("MainWindow", u"Browse", None))
         self.pushButton_index.setText(QCoreApplication.translate("MainWindow", u"Index", None))
+#if QT_CONFIG(tooltip)
+        self.pushButton_watch.setToolTip(QCoreApplication.translate("MainWindow", u"Keep indexing changes of the folder", None))
+#endif // QT_CONFIG(tooltip)
+        self.pushButton_watch.setText(QCoreApplication.translate("MainWindow", u"Watch", None))
         self.label.setText(QCoreApplication.translate("MainWindow", u"Search:", None))
         self.pushButton_search.setText(QCoreApplication.translate("MainWindow", u"Search", None))
         self.menuFile.setTitle(QCoreApplication.translate("MainWindow", u"File", None))
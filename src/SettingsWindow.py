@@ -6,8 +6,25 @@ from pathlib import Path
 from PySide6.QtCore import QSettings
 from PySide6.QtWidgets import QWidget
 
+from backend.hashing import HASH_ALGORITHMS
+from backend.model_registry import (
+    CLASSIFICATION_MODELS,
+    DETECTION_MODELS,
+    available_models,
+)
 from SettingsWindow_ui import Ui_Settings
 
+# onnxruntime names of the graph optimization and execution mode combo box items
+GRAPH_OPTIMIZATION_LEVELS = [
+    "ORT_DISABLE_ALL",
+    "ORT_ENABLE_BASIC",
+    "ORT_ENABLE_EXTENDED",
+    "ORT_ENABLE_ALL",
+]
+EXECUTION_MODES = ["ORT_SEQUENTIAL", "ORT_PARALLEL"]
+# index_backend values of the backend combo box items
+INDEX_BACKENDS = ["threads", "processes"]
+
 
 class SettingsWindow(QWidget, Ui_Settings):
     def __init__(self):
@@ -23,27 +40,14 @@ class SettingsWindow(QWidget, Ui_Settings):
 
     def get_models(self):
         model_dir = Path(__file__).parent / "models"
-        self.models_cls = []
-        self.models_coco = []
-
-        model_files = {
-            "YOLO11n": ["yolo11n.onnx", "yolo11n-cls.onnx"],
-            "YOLO11s": ["yolo11s.onnx", "yolo11s-cls.onnx"],
-            "YOLO11m": ["yolo11m.onnx", "yolo11m-cls.onnx"],
-            "YOLO11l": ["yolo11l.onnx", "yolo11l-cls.onnx"],
-            "YOLO11x": ["yolo11x.onnx", "yolo11x-cls.onnx"],
-        }
-
-        for model, files in model_files.items():
-            if Path(model_dir / files[0]).exists():
-                self.models_cls.append(model)
-            if Path(model_dir / files[1]).exists():
-                self.models_coco.append(model)
+        # fp32 models and the INT8 variants made by dev/quantize_models.py
+        self.models_cls = available_models(CLASSIFICATION_MODELS, model_dir)
+        self.models_coco = available_models(DETECTION_MODELS, model_dir)
 
         self.comboBox_classification_model.addItems(self.models_cls)
-        self.comboBox_object_detection_model.addItems(
-            model for model in self.models_coco
-        )
+        self.comboBox_object_detection_model.addItems(self.models_coco)
+        # after Auto, only the algorithms whose package is installed
+        self.comboBox_hash_algorithm.addItems(list(HASH_ALGORITHMS))
 
     def check_models(self):
         self.object_detection_model = self.comboBox_object_detection_model.currentText()
@@ -77,12 +81,85 @@ class SettingsWindow(QWidget, Ui_Settings):
         self.comboBox_OCR_model.setCurrentText(
             self.settings.value("OCR_model", "RapidOCR")
         )
+        self.spinBox_ocr_concurrency.setValue(
+            int(self.settings.value("ocr_concurrency", 0))
+        )
+        self.checkBox_ocr_gate.setChecked(
+            self.settings.value("ocr_gate", False, type=bool)
+        )
+        self.doubleSpinBox_ocr_gate_sensitivity.setValue(
+            float(self.settings.value("ocr_gate_sensitivity", 0.5))
+        )
         self.checkBox_update.setChecked(
             self.settings.value("FullUpdate", False, type=bool)
         )
         self.spinBox_batch_size.setValue(int(self.settings.value("batch_size", 100)))
+        self.spinBox_prefetch_depth.setValue(
+            int(self.settings.value("prefetch_depth", 2))
+        )
+        index_backend = self.settings.value("index_backend", "threads")
+        if index_backend not in INDEX_BACKENDS:
+            index_backend = "threads"
+        self.comboBox_index_backend.setCurrentIndex(INDEX_BACKENDS.index(index_backend))
+        self.spinBox_process_workers.setValue(
+            int(self.settings.value("process_workers", 0))
+        )
+        self.spinBox_max_in_flight.setValue(
+            int(self.settings.value("max_in_flight", 32))
+        )
+        self.spinBox_commit_interval.setValue(
+            int(self.settings.value("commit_interval", 1000))
+        )
+        hash_algorithm = self.settings.value("hash_algorithm", "Auto")
+        if hash_algorithm not in HASH_ALGORITHMS:
+            hash_algorithm = "Auto"
+        self.comboBox_hash_algorithm.setCurrentText(hash_algorithm)
+        self.checkBox_watch_polling.setChecked(
+            self.settings.value("watch_polling", False, type=bool)
+        )
+        self.spinBox_watch_poll_interval.setValue(
+            int(self.settings.value("watch_poll_interval", 60))
+        )
+        self.load_runtime_settings()
         self.save_settings()
 
+    def load_runtime_settings(self):
+        self.comboBox_provider_profile.setCurrentText(
+            self.settings.value("provider_profile", "Auto")
+        )
+        self.spinBox_thread_budget.setValue(
+            int(self.settings.value("thread_budget", 0))
+        )
+        self.spinBox_intra_op_threads.setValue(
+            int(self.settings.value("intra_op_num_threads", 0))
+        )
+        self.spinBox_inter_op_threads.setValue(
+            int(self.settings.value("inter_op_num_threads", 0))
+        )
+        graph_optimization_level = self.settings.value(
+            "graph_optimization_level", "ORT_ENABLE_ALL"
+        )
+        if graph_optimization_level not in GRAPH_OPTIMIZATION_LEVELS:
+            graph_optimization_level = "ORT_ENABLE_ALL"
+        self.comboBox_graph_optimization.setCurrentIndex(
+            GRAPH_OPTIMIZATION_LEVELS.index(graph_optimization_level)
+        )
+        execution_mode = self.settings.value("execution_mode", "ORT_SEQUENTIAL")
+        if execution_mode not in EXECUTION_MODES:
+            execution_mode = "ORT_SEQUENTIAL"
+        self.comboBox_execution_mode.setCurrentIndex(
+            EXECUTION_MODES.index(execution_mode)
+        )
+        self.checkBox_memory_arena.setChecked(
+            self.settings.value("enable_cpu_mem_arena", True, type=bool)
+        )
+        self.checkBox_save_optimized_models.setChecked(
+            self.settings.value("save_optimized_models", False, type=bool)
+        )
+        self.checkBox_quantized_models.setChecked(
+            self.settings.value("quantized_models", True, type=bool)
+        )
+
     def save_settings(self):
         self.settings.setValue(
             "classification_model", self.comboBox_classification_model.currentText()
@@ -107,8 +184,57 @@ class SettingsWindow(QWidget, Ui_Settings):
             self.doubleSpinBox_object_detection_iou.value(),
         )
         self.settings.setValue("OCR_model", self.comboBox_OCR_model.currentText())
+        self.settings.setValue("ocr_concurrency", self.spinBox_ocr_concurrency.value())
+        self.settings.setValue("ocr_gate", self.checkBox_ocr_gate.isChecked())
+        self.settings.setValue(
+            "ocr_gate_sensitivity", self.doubleSpinBox_ocr_gate_sensitivity.value()
+        )
         self.settings.setValue("FullUpdate", self.checkBox_update.isChecked())
         self.settings.setValue("batch_size", self.spinBox_batch_size.value())
+        self.settings.setValue("prefetch_depth", self.spinBox_prefetch_depth.value())
+        self.settings.setValue(
+            "index_backend", INDEX_BACKENDS[self.comboBox_index_backend.currentIndex()]
+        )
+        self.settings.setValue("process_workers", self.spinBox_process_workers.value())
+        self.settings.setValue("max_in_flight", self.spinBox_max_in_flight.value())
+        self.settings.setValue("commit_interval", self.spinBox_commit_interval.value())
+        self.settings.setValue(
+            "hash_algorithm", self.comboBox_hash_algorithm.currentText()
+        )
+        self.settings.setValue("watch_polling", self.checkBox_watch_polling.isChecked())
+        self.settings.setValue(
+            "watch_poll_interval", self.spinBox_watch_poll_interval.value()
+        )
+        self.save_runtime_settings()
+
+    def save_runtime_settings(self):
+        self.settings.setValue(
+            "provider_profile", self.comboBox_provider_profile.currentText()
+        )
+        self.settings.setValue("thread_budget", self.spinBox_thread_budget.value())
+        self.settings.setValue(
+            "intra_op_num_threads", self.spinBox_intra_op_threads.value()
+        )
+        self.settings.setValue(
+            "inter_op_num_threads", self.spinBox_inter_op_threads.value()
+        )
+        self.settings.setValue(
+            "graph_optimization_level",
+            GRAPH_OPTIMIZATION_LEVELS[self.comboBox_graph_optimization.currentIndex()],
+        )
+        self.settings.setValue(
+            "execution_mode",
+            EXECUTION_MODES[self.comboBox_execution_mode.currentIndex()],
+        )
+        self.settings.setValue(
+            "enable_cpu_mem_arena", self.checkBox_memory_arena.isChecked()
+        )
+        self.settings.setValue(
+            "save_optimized_models", self.checkBox_save_optimized_models.isChecked()
+        )
+        self.settings.setValue(
+            "quantized_models", self.checkBox_quantized_models.isChecked()
+        )
 
     def gui_save(self):
         self.save_settings()
@@ -23,7 +23,7 @@ class Ui_Settings(object):
     def setupUi(self, Settings):
         if not Settings.objectName():
             Settings.setObjectName(u"Settings")
-        Settings.resize(500, 400)
+        Settings.resize(500, 620)
         icon = QIcon()
         icon.addFile(u"icon.ico", QSize(), QIcon.Mode.Normal, QIcon.State.Off)
         Settings.setWindowIcon(icon)
@@ -159,6 +159,46 @@ class Ui_Settings(object):
 
         self.verticalLayout.addLayout(self.horizontalLayout_5)
 
+        self.horizontalLayout_15 = QHBoxLayout()
+        self.horizontalLayout_15.setObjectName(u"horizontalLayout_15")
+        self.label_13 = QLabel(self.groupBox_4)
+        self.label_13.setObjectName(u"label_13")
+
+        self.horizontalLayout_15.addWidget(self.label_13)
+
+        self.spinBox_ocr_concurrency = QSpinBox(self.groupBox_4)
+        self.spinBox_ocr_concurrency.setObjectName(u"spinBox_ocr_concurrency")
+        self.spinBox_ocr_concurrency.setMaximum(16)
+
+        self.horizontalLayout_15.addWidget(self.spinBox_ocr_concurrency)
+
+
+        self.verticalLayout.addLayout(self.horizontalLayout_15)
+
+        self.horizontalLayout_16 = QHBoxLayout()
+        self.horizontalLayout_16.setObjectName(u"horizontalLayout_16")
+        self.checkBox_ocr_gate = QCheckBox(self.groupBox_4)
+        self.checkBox_ocr_gate.setObjectName(u"checkBox_ocr_gate")
+
+        self.horizontalLayout_16.addWidget(self.checkBox_ocr_gate)
+
+        self.label_14 = QLabel(self.groupBox_4)
+        self.label_14.setObjectName(u"label_14")
+
+        self.horizontalLayout_16.addWidget(self.label_14)
+
+        self.doubleSpinBox_ocr_gate_sensitivity = QDoubleSpinBox(self.groupBox_4)
+        self.doubleSpinBox_ocr_gate_sensitivity.setObjectName(u"doubleSpinBox_ocr_gate_sensitivity")
+        self.doubleSpinBox_ocr_gate_sensitivity.setMinimum(0.050000000000000)
+        self.doubleSpinBox_ocr_gate_sensitivity.setMaximum(1.000000000000000)
+        self.doubleSpinBox_ocr_gate_sensitivity.setSingleStep(0.050000000000000)
+        self.doubleSpinBox_ocr_gate_sensitivity.setValue(0.500000000000000)
+
+        self.horizontalLayout_16.addWidget(self.doubleSpinBox_ocr_gate_sensitivity)
+
+
+        self.verticalLayout.addLayout(self.horizontalLayout_16)
+
 
         self.verticalLayout_3.addWidget(self.groupBox_4)
 
@@ -191,15 +231,236 @@ class Ui_Settings(object):
 
         self.horizontalLayout.addWidget(self.spinBox_batch_size)
 
+        self.label_16 = QLabel(self.groupBox_5)
+        self.label_16.setObjectName(u"label_16")
+
+        self.horizontalLayout.addWidget(self.label_16)
+
+        self.spinBox_prefetch_depth = QSpinBox(self.groupBox_5)
+        self.spinBox_prefetch_depth.setObjectName(u"spinBox_prefetch_depth")
+        self.spinBox_prefetch_depth.setMinimum(1)
+        self.spinBox_prefetch_depth.setMaximum(8)
+        self.spinBox_prefetch_depth.setValue(2)
+
+        self.horizontalLayout.addWidget(self.spinBox_prefetch_depth)
+
 
         self.horizontalLayout_10.addLayout(self.horizontalLayout)
 
 
         self.verticalLayout_5.addLayout(self.horizontalLayout_10)
 
+        self.horizontalLayout_18 = QHBoxLayout()
+        self.horizontalLayout_18.setObjectName(u"horizontalLayout_18")
+        self.label_18 = QLabel(self.groupBox_5)
+        self.label_18.setObjectName(u"label_18")
+
+        self.horizontalLayout_18.addWidget(self.label_18)
+
+        self.comboBox_index_backend = QComboBox(self.groupBox_5)
+        self.comboBox_index_backend.addItem("")
+        self.comboBox_index_backend.addItem("")
+        self.comboBox_index_backend.setObjectName(u"comboBox_index_backend")
+
+        self.horizontalLayout_18.addWidget(self.comboBox_index_backend)
+
+        self.label_19 = QLabel(self.groupBox_5)
+        self.label_19.setObjectName(u"label_19")
+
+        self.horizontalLayout_18.addWidget(self.label_19)
+
+        self.spinBox_process_workers = QSpinBox(self.groupBox_5)
+        self.spinBox_process_workers.setObjectName(u"spinBox_process_workers")
+        self.spinBox_process_workers.setMaximum(256)
+
+        self.horizontalLayout_18.addWidget(self.spinBox_process_workers)
+
+        self.label_20 = QLabel(self.groupBox_5)
+        self.label_20.setObjectName(u"label_20")
+
+        self.horizontalLayout_18.addWidget(self.label_20)
+
+        self.spinBox_max_in_flight = QSpinBox(self.groupBox_5)
+        self.spinBox_max_in_flight.setObjectName(u"spinBox_max_in_flight")
+        self.spinBox_max_in_flight.setMinimum(1)
+        self.spinBox_max_in_flight.setMaximum(1024)
+        self.spinBox_max_in_flight.setValue(32)
+
+        self.horizontalLayout_18.addWidget(self.spinBox_max_in_flight)
+
+
+        self.verticalLayout_5.addLayout(self.horizontalLayout_18)
+
+        self.horizontalLayout_19 = QHBoxLayout()
+        self.horizontalLayout_19.setObjectName(u"horizontalLayout_19")
+        self.label_21 = QLabel(self.groupBox_5)
+        self.label_21.setObjectName(u"label_21")
+
+        self.horizontalLayout_19.addWidget(self.label_21)
+
+        self.spinBox_commit_interval = QSpinBox(self.groupBox_5)
+        self.spinBox_commit_interval.setObjectName(u"spinBox_commit_interval")
+        self.spinBox_commit_interval.setMinimum(1)
+        self.spinBox_commit_interval.setMaximum(100000)
+        self.spinBox_commit_interval.setValue(1000)
+
+        self.horizontalLayout_19.addWidget(self.spinBox_commit_interval)
+
+        self.label_22 = QLabel(self.groupBox_5)
+        self.label_22.setObjectName(u"label_22")
+
+        self.horizontalLayout_19.addWidget(self.label_22)
+
+        self.comboBox_hash_algorithm = QComboBox(self.groupBox_5)
+        self.comboBox_hash_algorithm.addItem("")
+        self.comboBox_hash_algorithm.setObjectName(u"comboBox_hash_algorithm")
+
+        self.horizontalLayout_19.addWidget(self.comboBox_hash_algorithm)
+
+
+        self.verticalLayout_5.addLayout(self.horizontalLayout_19)
+
+        self.horizontalLayout_17 = QHBoxLayout()
+        self.horizontalLayout_17.setObjectName(u"horizontalLayout_17")
+        self.checkBox_watch_polling = QCheckBox(self.groupBox_5)
+        self.checkBox_watch_polling.setObjectName(u"checkBox_watch_polling")
+
+        self.horizontalLayout_17.addWidget(self.checkBox_watch_polling)
+
+        self.label_17 = QLabel(self.groupBox_5)
+        self.label_17.setObjectName(u"label_17")
+
+        self.horizontalLayout_17.addWidget(self.label_17)
+
+        self.spinBox_watch_poll_interval = QSpinBox(self.groupBox_5)
+        self.spinBox_watch_poll_interval.setObjectName(u"spinBox_watch_poll_interval")
+        self.spinBox_watch_poll_interval.setMinimum(5)
+        self.spinBox_watch_poll_interval.setMaximum(86400)
+        self.spinBox_watch_poll_interval.setValue(60)
+
+        self.horizontalLayout_17.addWidget(self.spinBox_watch_poll_interval)
+
+
+        self.verticalLayout_5.addLayout(self.horizontalLayout_17)
+
 
         self.verticalLayout_4.addWidget(self.groupBox_5)
 
+        self.groupBox_6 = QGroupBox(Settings)
+        self.groupBox_6.setObjectName(u"groupBox_6")
+        self.verticalLayout_6 = QVBoxLayout(self.groupBox_6)
+        self.verticalLayout_6.setObjectName(u"verticalLayout_6")
+        self.horizontalLayout_11 = QHBoxLayout()
+        self.horizontalLayout_11.setObjectName(u"horizontalLayout_11")
+        self.label_8 = QLabel(self.groupBox_6)
+        self.label_8.setObjectName(u"label_8")
+
+        self.horizontalLayout_11.addWidget(self.label_8)
+
+        self.comboBox_provider_profile = QComboBox(self.groupBox_6)
+        self.comboBox_provider_profile.addItem("")
+        self.comboBox_provider_profile.addItem("")
+        self.comboBox_provider_profile.addItem("")
+        self.comboBox_provider_profile.addItem("")
+        self.comboBox_provider_profile.setObjectName(u"comboBox_provider_profile")
+
+        self.horizontalLayout_11.addWidget(self.comboBox_provider_profile)
+
+
+        self.verticalLayout_6.addLayout(self.horizontalLayout_11)
+
+        self.horizontalLayout_12 = QHBoxLayout()
+        self.horizontalLayout_12.setObjectName(u"horizontalLayout_12")
+        self.label_15 = QLabel(self.groupBox_6)
+        self.label_15.setObjectName(u"label_15")
+
+        self.horizontalLayout_12.addWidget(self.label_15)
+
+        self.spinBox_thread_budget = QSpinBox(self.groupBox_6)
+        self.spinBox_thread_budget.setObjectName(u"spinBox_thread_budget")
+        self.spinBox_thread_budget.setMaximum(256)
+
+        self.horizontalLayout_12.addWidget(self.spinBox_thread_budget)
+
+        self.label_9 = QLabel(self.groupBox_6)
+        self.label_9.setObjectName(u"label_9")
+
+        self.horizontalLayout_12.addWidget(self.label_9)
+
+        self.spinBox_intra_op_threads = QSpinBox(self.groupBox_6)
+        self.spinBox_intra_op_threads.setObjectName(u"spinBox_intra_op_threads")
+        self.spinBox_intra_op_threads.setMaximum(256)
+
+        self.horizontalLayout_12.addWidget(self.spinBox_intra_op_threads)
+
+        self.label_10 = QLabel(self.groupBox_6)
+        self.label_10.setObjectName(u"label_10")
+
+        self.horizontalLayout_12.addWidget(self.label_10)
+
+        self.spinBox_inter_op_threads = QSpinBox(self.groupBox_6)
+        self.spinBox_inter_op_threads.setObjectName(u"spinBox_inter_op_threads")
+        self.spinBox_inter_op_threads.setMaximum(256)
+
+        self.horizontalLayout_12.addWidget(self.spinBox_inter_op_threads)
+
+
+        self.verticalLayout_6.addLayout(self.horizontalLayout_12)
+
+        self.horizontalLayout_13 = QHBoxLayout()
+        self.horizontalLayout_13.setObjectName(u"horizontalLayout_13")
+        self.label_11 = QLabel(self.groupBox_6)
+        self.label_11.setObjectName(u"label_11")
+
+        self.horizontalLayout_13.addWidget(self.label_11)
+
+        self.comboBox_graph_optimization = QComboBox(self.groupBox_6)
+        self.comboBox_graph_optimization.addItem("")
+        self.comboBox_graph_optimization.addItem("")
+        self.comboBox_graph_optimization.addItem("")
+        self.comboBox_graph_optimization.addItem("")
+        self.comboBox_graph_optimization.setObjectName(u"comboBox_graph_optimization")
+
+        self.horizontalLayout_13.addWidget(self.comboBox_graph_optimization)
+
+        self.label_12 = QLabel(self.groupBox_6)
+        self.label_12.setObjectName(u"label_12")
+
+        self.horizontalLayout_13.addWidget(self.label_12)
+
+        self.comboBox_execution_mode = QComboBox(self.groupBox_6)
+        self.comboBox_execution_mode.addItem("")
+        self.comboBox_execution_mode.addItem("")
+        self.comboBox_execution_mode.setObjectName(u"comboBox_execution_mode")
+
+        self.horizontalLayout_13.addWidget(self.comboBox_execution_mode)
+
+
+        self.verticalLayout_6.addLayout(self.horizontalLayout_13)
+
+        self.horizontalLayout_14 = QHBoxLayout()
+        self.horizontalLayout_14.setObjectName(u"horizontalLayout_14")
+        self.checkBox_memory_arena = QCheckBox(self.groupBox_6)
+        self.checkBox_memory_arena.setObjectName(u"checkBox_memory_arena")
+
+        self.horizontalLayout_14.addWidget(self.checkBox_memory_arena)
+
+        self.checkBox_save_optimized_models = QCheckBox(self.groupBox_6)
+        self.checkBox_save_optimized_models.setObjectName(u"checkBox_save_optimized_models")
+
+        self.horizontalLayout_14.addWidget(self.checkBox_save_optimized_models)
+
+        self.checkBox_quantized_models = QCheckBox(self.groupBox_6)
+        self.checkBox_quantized_models.setObjectName(u"checkBox_quantized_models")
+
+        self.horizontalLayout_14.addWidget(self.checkBox_quantized_models)
+
+
+        self.verticalLayout_6.addLayout(self.horizontalLayout_14)
+
+
+        self.verticalLayout_4.addWidget(self.groupBox_6)
+
         self.pushButton_save = QPushButton(Settings)
         self.pushButton_save.setObjectName(u"pushButton_save")
 
@@ -230,9 +491,83 @@ class Ui_Settings(object):
         self.comboBox_OCR_model.setItemText(0, QCoreApplication.translate("Settings", u"RapidOCR", None))
         self.comboBox_OCR_model.setItemText(1, QCoreApplication.translate("Settings", u"None", None))
 
+        self.label_13.setText(QCoreApplication.translate("Settings", u"Concurrency:", None))
+        self.spinBox_ocr_concurrency.setSpecialValueText(QCoreApplication.translate("Settings", u"Auto", None))
+#if QT_CONFIG(tooltip)
+        self.checkBox_ocr_gate.setToolTip(QCoreApplication.translate("Settings", u"Only run OCR on images where text is detected", None))
+#endif // QT_CONFIG(tooltip)
+        self.checkBox_ocr_gate.setText(QCoreApplication.translate("Settings", u"Skip Images Without Text", None))
+        self.label_14.setText(QCoreApplication.translate("Settings", u"Sensitivity:", None))
         self.groupBox_5.setTitle(QCoreApplication.translate("Settings", u"Index Setting", None))
         self.checkBox_update.setText(QCoreApplication.translate("Settings", u"Fully Update Database", None))
         self.label_7.setText(QCoreApplication.translate("Settings", u"Batch Size:", None))
+        self.label_16.setText(QCoreApplication.translate("Settings", u"Prefetch Batches:", None))
+#if QT_CONFIG(tooltip)
+        self.spinBox_prefetch_depth.setToolTip(QCoreApplication.translate("Settings", u"Batches indexed at once, the next batch is read while the previous ones are in the models", None))
+#endif // QT_CONFIG(tooltip)
+        self.label_18.setText(QCoreApplication.translate("Settings", u"Backend:", None))
+        self.comboBox_index_backend.setItemText(0, QCoreApplication.translate("Settings", u"Threads", None))
+        self.comboBox_index_backend.setItemText(1, QCoreApplication.translate("Settings", u"Processes", None))
+
+#if QT_CONFIG(tooltip)
+        self.comboBox_index_backend.setToolTip(QCoreApplication.translate("Settings", u"Threads share the models in this process, processes each load their own models", None))
+#endif // QT_CONFIG(tooltip)
+        self.label_19.setText(QCoreApplication.translate("Settings", u"Processes:", None))
+#if QT_CONFIG(tooltip)
+        self.spinBox_process_workers.setToolTip(QCoreApplication.translate("Settings", u"Indexing processes of the processes backend, Auto uses half of the cores", None))
+#endif // QT_CONFIG(tooltip)
+        self.spinBox_process_workers.setSpecialValueText(QCoreApplication.translate("Settings", u"Auto", None))
+        self.label_20.setText(QCoreApplication.translate("Settings", u"Images In Flight:", None))
+#if QT_CONFIG(tooltip)
+        self.spinBox_max_in_flight.setToolTip(QCoreApplication.translate("Settings", u"Decoded images held at a time, more keeps the models busier but uses more memory", None))
+#endif // QT_CONFIG(tooltip)
+        self.label_21.setText(QCoreApplication.translate("Settings", u"Commit Interval (rows):", None))
+#if QT_CONFIG(tooltip)
+        self.spinBox_commit_interval.setToolTip(QCoreApplication.translate("Settings", u"Rows written before each commit, results not committed yet are lost if indexing is interrupted", None))
+#endif // QT_CONFIG(tooltip)
+        self.label_22.setText(QCoreApplication.translate("Settings", u"Hash Algorithm:", None))
+        self.comboBox_hash_algorithm.setItemText(0, QCoreApplication.translate("Settings", u"Auto", None))
+
+#if QT_CONFIG(tooltip)
+        self.comboBox_hash_algorithm.setToolTip(QCoreApplication.translate("Settings", u"Hash of the file contents, Auto uses the fastest installed", None))
+#endif // QT_CONFIG(tooltip)
+#if QT_CONFIG(tooltip)
+        self.checkBox_watch_polling.setToolTip(QCoreApplication.translate("Settings", u"Scan the watched folder periodically instead of relying on change notifications, for network shares", None))
+#endif // QT_CONFIG(tooltip)
+        self.checkBox_watch_polling.setText(QCoreApplication.translate("Settings", u"Poll Watched Folder", None))
+        self.label_17.setText(QCoreApplication.translate("Settings", u"Poll Interval (s):", None))
+#if QT_CONFIG(tooltip)
+        self.spinBox_watch_poll_interval.setToolTip(QCoreApplication.translate("Settings", u"Seconds between scans when polling, and between checks for pictures modified in place when watching", None))
+#endif // QT_CONFIG(tooltip)
+        self.groupBox_6.setTitle(QCoreApplication.translate("Settings", u"Runtime Settings", None))
+        self.label_8.setText(QCoreApplication.translate("Settings", u"Execution Provider:", None))
+        self.comboBox_provider_profile.setItemText(0, QCoreApplication.translate("Settings", u"Auto", None))
+        self.comboBox_provider_profile.setItemText(1, QCoreApplication.translate("Settings", u"CPU", None))
+        self.comboBox_provider_profile.setItemText(2, QCoreApplication.translate("Settings", u"CUDA", None))
+        self.comboBox_provider_profile.setItemText(3, QCoreApplication.translate("Settings", u"DirectML", None))
+
+        self.label_15.setText(QCoreApplication.translate("Settings", u"Thread Budget:", None))
+#if QT_CONFIG(tooltip)
+        self.spinBox_thread_budget.setToolTip(QCoreApplication.translate("Settings", u"Inference threads shared by the models, Auto uses all cores", None))
+#endif // QT_CONFIG(tooltip)
+        self.spinBox_thread_budget.setSpecialValueText(QCoreApplication.translate("Settings", u"Auto", None))
+        self.label_9.setText(QCoreApplication.translate("Settings", u"Intra-op Threads:", None))
+        self.spinBox_intra_op_threads.setSpecialValueText(QCoreApplication.translate("Settings", u"Auto", None))
+        self.label_10.setText(QCoreApplication.translate("Settings", u"Inter-op Threads:", None))
+        self.spinBox_inter_op_threads.setSpecialValueText(QCoreApplication.translate("Settings", u"Auto", None))
+        self.label_11.setText(QCoreApplication.translate("Settings", u"Graph Optimization:", None))
+        self.comboBox_graph_optimization.setItemText(0, QCoreApplication.translate("Settings", u"Disabled", None))
+        self.comboBox_graph_optimization.setItemText(1, QCoreApplication.translate("Settings", u"Basic", None))
+        self.comboBox_graph_optimization.setItemText(2, QCoreApplication.translate("Settings", u"Extended", None))
+        self.comboBox_graph_optimization.setItemText(3, QCoreApplication.translate("Settings", u"All", None))
+
+        self.label_12.setText(QCoreApplication.translate("Settings", u"Execution Mode:", None))
+        self.comboBox_execution_mode.setItemText(0, QCoreApplication.translate("Settings", u"Sequential", None))
+        self.comboBox_execution_mode.setItemText(1, QCoreApplication.translate("Settings", u"Parallel", None))
+
+        self.checkBox_memory_arena.setText(QCoreApplication.translate("Settings", u"CPU Memory Arena", None))
+        self.checkBox_save_optimized_models.setText(QCoreApplication.translate("Settings", u"Save Optimized Models", None))
+        self.checkBox_quantized_models.setText(QCoreApplication.translate("Settings", u"INT8 Models on CPU", None))
         self.pushButton_save.setText(QCoreApplication.translate("Settings", u"Save", None))
     # retranslateUi
 
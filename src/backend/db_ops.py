@@ -3,19 +3,58 @@ import sqlite3
 import sys
 from pathlib import Path
 
+from backend.hashing import LEGACY_HASH_ALGORITHM
+
+# inference results, one row per content hash and model settings
 TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS pictures (
+CREATE TABLE IF NOT EXISTS results (
     id INTEGER PRIMARY KEY,
-    hash TEXT,
-    path TEXT UNIQUE,
+    hash TEXT NOT NULL,
+    hash_algorithm TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
     classification TEXT,
     classification_confidence REAL,
     object TEXT,
     object_confidence REAL,
     OCR TEXT,
     ocr_confidence REAL,
+    created_at INTEGER DEFAULT (strftime('%s', 'now')),
+    UNIQUE (hash, hash_algorithm, fingerprint)
+);
+"""
+PATHS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    result_id INTEGER REFERENCES results(id),
+    size INTEGER,
+    mtime_ns INTEGER,
+    inode INTEGER,
     created_at INTEGER DEFAULT (strftime('%s', 'now'))
 );
+CREATE INDEX IF NOT EXISTS paths_result_id ON paths(result_id);
+"""
+# same columns as the pictures table of older versions, ResultList reads rows by index
+VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS pictures AS
+SELECT
+    paths.id AS id,
+    results.hash AS hash,
+    paths.path AS path,
+    results.classification AS classification,
+    results.classification_confidence AS classification_confidence,
+    results.object AS object,
+    results.object_confidence AS object_confidence,
+    results.OCR AS OCR,
+    results.ocr_confidence AS ocr_confidence,
+    paths.created_at AS created_at,
+    paths.size AS size,
+    paths.mtime_ns AS mtime_ns,
+    paths.inode AS inode,
+    results.hash_algorithm AS hash_algorithm,
+    results.fingerprint AS fingerprint,
+    paths.result_id AS result_id
+FROM paths JOIN results ON paths.result_id = results.id;
 """
 
 HISTORY_TABLE_SQL = """
@@ -34,56 +73,99 @@ CREATE TABLE IF NOT EXISTS history (
 """
 
 SEARCH_TABLE_SQL = """
-CREATE VIRTUAL TABLE IF NOT EXISTS pictures_fts USING fts5(
+CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
     id,
     classification,
     object,
     OCR,
-    content = pictures,
+    content = results,
     content_rowid = id,
     tokenize = "simple"
 );
 """
 TRIGGER_SQL = """
-CREATE TRIGGER IF NOT EXISTS pictures_ai AFTER INSERT ON pictures BEGIN
-    INSERT INTO pictures_fts(rowid, classification, object, OCR) VALUES (new.id, new.classification, new.object, new.OCR);
+CREATE TRIGGER IF NOT EXISTS results_ai AFTER INSERT ON results BEGIN
+    INSERT INTO results_fts(rowid, classification, object, OCR) VALUES (new.id, new.classification, new.object, new.OCR);
 END;
-CREATE TRIGGER IF NOT EXISTS pictures_ad AFTER DELETE ON pictures BEGIN
-    INSERT INTO pictures_fts(pictures_fts, rowid, classification, object, OCR) VALUES('delete', old.id, old.classification, old.object, old.OCR);
+CREATE TRIGGER IF NOT EXISTS results_ad AFTER DELETE ON results BEGIN
+    INSERT INTO results_fts(results_fts, rowid, classification, object, OCR) VALUES('delete', old.id, old.classification, old.object, old.OCR);
 END;
-CREATE TRIGGER IF NOT EXISTS pictures_au AFTER UPDATE ON pictures BEGIN
-    INSERT INTO pictures_fts(pictures_fts, rowid, classification, object, OCR) VALUES('delete', old.id, old.classification, old.object, old.OCR);
-    INSERT INTO pictures_fts(rowid, classification, object, OCR) VALUES (new.id, new.classification, new.object, new.OCR);
+CREATE TRIGGER IF NOT EXISTS results_au AFTER UPDATE OF classification, object, OCR ON results BEGIN
+    INSERT INTO results_fts(results_fts, rowid, classification, object, OCR) VALUES('delete', old.id, old.classification, old.object, old.OCR);
+    INSERT INTO results_fts(rowid, classification, object, OCR) VALUES (new.id, new.classification, new.object, new.OCR);
 END;
 """
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS results_ai;
+DROP TRIGGER IF EXISTS results_ad;
+DROP TRIGGER IF EXISTS results_au;
+"""
+DROP_LEGACY_SQL = """
+DROP TABLE IF EXISTS pictures_fts;
+DROP TABLE IF EXISTS pictures;
+"""
+REBUILD_FTS_SQL = """
+INSERT INTO results_fts(results_fts) VALUES('rebuild');
+"""
+OPTIMIZE_FTS_SQL = """
+INSERT INTO results_fts(results_fts) VALUES('optimize');
+"""
 SEARCH_SIMPLE_SQL = """
-SELECT * FROM pictures WHERE id IN (SELECT id FROM pictures_fts WHERE pictures_fts MATCH simple_query(?) ORDER BY rank);
+SELECT * FROM pictures WHERE result_id IN (SELECT rowid FROM results_fts WHERE results_fts MATCH simple_query(?) ORDER BY rank);
 """
 INIT_JIEBA_SQL = """
 SELECT jieba_dict(?);
 """
 SEARCH_JIEBA_SQL = """
-SELECT * FROM pictures WHERE id IN (SELECT id FROM pictures_fts WHERE pictures_fts MATCH jieba_query(?) ORDER BY rank);
+SELECT * FROM pictures WHERE result_id IN (SELECT rowid FROM results_fts WHERE results_fts MATCH jieba_query(?) ORDER BY rank);
 """
-# insert, update if path exists
-INSERT_SQL = """
-INSERT INTO pictures (hash, path, classification, classification_confidence, object, object_confidence, OCR, ocr_confidence)
-VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-ON CONFLICT(path) DO UPDATE SET
+# insert, update only if the results changed so the FTS index is left alone
+INSERT_RESULT_SQL = """
+INSERT INTO results (hash, hash_algorithm, fingerprint, classification, classification_confidence, object, object_confidence, OCR, ocr_confidence)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(hash, hash_algorithm, fingerprint) DO UPDATE SET
     classification = excluded.classification,
     classification_confidence = excluded.classification_confidence,
     object = excluded.object,
     object_confidence = excluded.object_confidence,
     OCR = excluded.OCR,
-    ocr_confidence = excluded.ocr_confidence;
+    ocr_confidence = excluded.ocr_confidence
+WHERE (classification, classification_confidence, object, object_confidence, OCR, ocr_confidence)
+    IS NOT (excluded.classification, excluded.classification_confidence, excluded.object, excluded.object_confidence, excluded.OCR, excluded.ocr_confidence);
+"""
+# insert, update if path exists
+INSERT_PATH_SQL = """
+INSERT INTO paths (path, result_id, size, mtime_ns, inode)
+VALUES (?, (SELECT id FROM results WHERE hash = ? AND hash_algorithm = ? AND fingerprint = ?), ?, ?, ?)
+ON CONFLICT(path) DO UPDATE SET
+    result_id = excluded.result_id,
+    size = excluded.size,
+    mtime_ns = excluded.mtime_ns,
+    inode = excluded.inode;
 """
 
 FETCH_SQL = """
 SELECT * FROM pictures WHERE path = ?;
 """
 
+FETCH_SIGNATURES_SQL = """
+SELECT path, hash, hash_algorithm, size, mtime_ns, inode FROM pictures;
+"""
+
+UPDATE_SIGNATURE_SQL = """
+UPDATE paths SET size = ?, mtime_ns = ?, inode = ? WHERE path = ?;
+"""
+
+RENAME_SQL = """
+UPDATE paths SET path = ?, size = ?, mtime_ns = ?, inode = ? WHERE path = ?;
+"""
+
 REMOVE_SQL = """
-DELETE FROM pictures WHERE path = ?;
+DELETE FROM paths WHERE path = ?;
+"""
+
+REMOVE_ORPHANS_SQL = """
+DELETE FROM results WHERE id NOT IN (SELECT result_id FROM paths WHERE result_id IS NOT NULL);
 """
 
 HISTORY_INSERT_SQL = """
@@ -91,10 +173,63 @@ INSERT INTO history (classification_model, classification_threshold, object_dete
 VALUES (?, ?, ?, ?, ?, ?, ?, ?);
 """
 
+FETCH_HISTORY_SETTINGS_SQL = """
+SELECT id, classification_model, classification_threshold, object_detection_model,
+object_detection_dataset, object_detection_confidence, object_detection_iou, OCR_model
+FROM history;
+"""
+
+FETCH_REUSABLE_HASHES_SQL = """
+SELECT hash FROM results WHERE hash_algorithm = ? AND fingerprint = ?;
+"""
+
+FETCH_REUSABLE_SQL = """
+SELECT classification, classification_confidence, object, object_confidence, OCR, ocr_confidence
+FROM results WHERE hash = ? AND hash_algorithm = ? AND fingerprint = ?;
+"""
+
 RETURN_ALL_SQL = """
 SELECT * FROM pictures;
 """
 
+# fingerprint of results migrated from a version that did not record the settings
+LEGACY_FINGERPRINT = ""
+
+
+def model_fingerprint(
+    classification_model,
+    classification_threshold,
+    object_detection_model,
+    object_detection_dataset,
+    object_detection_confidence,
+    object_detection_iou,
+    OCR_model,
+    ocr_gate_sensitivity=None,
+):
+    """
+    Returns a string identifying the model settings, results are only reused
+    for a hash indexed with the same fingerprint.
+    """
+    if not isinstance(object_detection_dataset, str):
+        object_detection_dataset = ",".join(object_detection_dataset)
+    if classification_model in (None, "None"):
+        classification = "None"
+    else:
+        classification = f"{classification_model}:{float(classification_threshold):g}"
+    if object_detection_model in (None, "None"):
+        object_detection = "None"
+    else:
+        object_detection = (
+            f"{object_detection_model}:{object_detection_dataset}:"
+            f"{float(object_detection_confidence):g}:{float(object_detection_iou):g}"
+        )
+    OCR = OCR_model
+    if OCR_model not in (None, "None") and ocr_gate_sensitivity is not None:
+        # images rejected by the text gate have no OCR results
+        OCR = f"{OCR_model}:gate:{float(ocr_gate_sensitivity):g}"
+    return f"{classification}|{object_detection}|{OCR}"
+
+
 # prepare for multi-platform
 if sys.platform == "win32":
     lib_dir_name = "libsimple-windows-x64"
@@ -113,7 +248,14 @@ else:
 
 
 class DB:
-    def __init__(self, path, jieba=False):
+    def __init__(self, path, jieba=False, commit_interval=1):
+        """
+        Args:
+            path: Path of the database file.
+            jieba (bool, optional): Use the jieba tokenizer for search. Defaults to False.
+            commit_interval (int, optional): Rows written by insert_many before a
+                commit. Defaults to 1, commit after every call.
+        """
         extention_path = lib_dir / "simple"
         dict_path = lib_dir / "dict"
 
@@ -122,14 +264,88 @@ class DB:
         self.conn.execute("PRAGMA temp_store = 2;")
         self.conn.enable_load_extension(True)
         self.conn.load_extension(extention_path.as_posix())
+        self.jieba = jieba
+        self.commit_interval = commit_interval
+        self.uncommitted_rows = 0
+        # a bulk load that did not finish leaves the FTS index out of date,
+        # results migrated from the pictures table of older versions are not indexed
+        has_results = self.table_exists("results")
+        has_triggers = self.table_exists("results_ai", "trigger")
+        has_legacy = self.table_exists("pictures")
         self.conn.execute(TABLE_SQL)
+        self.conn.executescript(PATHS_TABLE_SQL)
         self.conn.execute(HISTORY_TABLE_SQL)
         self.conn.execute(SEARCH_TABLE_SQL)
+        if has_legacy:
+            self.migrate_pictures()
+        self.conn.executescript(VIEW_SQL)
         self.conn.executescript(TRIGGER_SQL)
-        self.jieba = jieba
+        if has_legacy or (has_results and not has_triggers):
+            self.rebuild_fts()
         if jieba:
             self.init_jieba(dict_path.as_posix())
 
+    def table_exists(self, name, type="table"):
+        return (
+            self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (type, name)
+            ).fetchone()
+            is not None
+        )
+
+    def migrate_pictures(self):
+        """
+        Moves the rows of the per path pictures table of older versions to the
+        results and paths tables, the pictures table is replaced by a view.
+        """
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(pictures)")]
+
+        def column(name):
+            # columns added to the pictures table over time may be missing
+            return name if name in columns else "NULL"
+
+        fingerprints = {
+            row[0]: model_fingerprint(*row[1:])
+            for row in self.conn.execute(FETCH_HISTORY_SETTINGS_SQL)
+        }
+        pictures = self.conn.execute(
+            "SELECT hash, path, classification, classification_confidence, object, "
+            "object_confidence, OCR, ocr_confidence, "
+            f"{column('size')}, {column('mtime_ns')}, {column('inode')}, "
+            f"{column('hash_algorithm')}, {column('history_id')} FROM pictures"
+        ).fetchall()
+        rows = [
+            (
+                *picture[:11],
+                picture[11] or LEGACY_HASH_ALGORITHM,
+                fingerprints.get(picture[12], LEGACY_FINGERPRINT),
+            )
+            for picture in pictures
+        ]
+        # the triggers are created after the migration, the FTS index is rebuilt once
+        self.insert_many(rows)
+        self.commit()
+        self.conn.executescript(DROP_LEGACY_SQL)
+
+    def begin_bulk_load(self):
+        """
+        Stops updating the FTS index row by row, for full re-indexes.
+
+        end_bulk_load rebuilds the index in one pass and restores the triggers.
+        """
+        self.commit()
+        self.conn.executescript(DROP_TRIGGER_SQL)
+
+    def end_bulk_load(self):
+        self.commit()
+        self.rebuild_fts()
+        self.conn.executescript(TRIGGER_SQL)
+
+    def rebuild_fts(self):
+        self.conn.execute(REBUILD_FTS_SQL)
+        self.conn.execute(OPTIMIZE_FTS_SQL)
+        self.commit()
+
     def search(self, query):
         # if query is empty, return all
         if not query or query == "":
@@ -139,11 +355,6 @@ class DB:
         else:
             return self.conn.execute(SEARCH_SIMPLE_SQL, (query,)).fetchall()
 
-    def check_hash(self, hash):
-        return self.conn.execute(
-            "SELECT * FROM pictures WHERE hash = ?", (hash,)
-        ).fetchall()
-
     def init_jieba(self, dict_path):
         self.conn.execute(INIT_JIEBA_SQL, (dict_path,))
 
@@ -159,7 +370,7 @@ class DB:
         full_update,
     ):
         object_detection_dataset = ",".join(object_detection_dataset)
-        self.conn.execute(
+        cursor = self.conn.execute(
             HISTORY_INSERT_SQL,
             (
                 classification_model,
@@ -173,15 +384,59 @@ class DB:
             ),
         )
         self.conn.commit()
+        return cursor.lastrowid
 
     def fetch(self, path):
         return self.conn.execute(FETCH_SQL, (path,)).fetchone()
 
-    def fetch_all(self):
-        results = self.conn.execute("SELECT * FROM pictures").fetchall()
-        # path:hash
-        res_dict = {result[2]: result[1] for result in results}
-        return res_dict
+    def fetch_reusable_hashes(self, hash_algorithm, fingerprint):
+        """
+        Hashes of pictures indexed with the model settings of fingerprint,
+        their results can be copied to duplicates instead of running the models.
+        """
+        results = self.conn.execute(
+            FETCH_REUSABLE_HASHES_SQL, (hash_algorithm, fingerprint)
+        ).fetchall()
+        return {result[0] for result in results}
+
+    def fetch_reusable(self, hash, hash_algorithm, fingerprint):
+        """
+        Returns (classification, classification_confidence, object, object_confidence,
+        OCR, ocr_confidence) of the hash indexed with the model settings of
+        fingerprint, or None.
+        """
+        return self.conn.execute(
+            FETCH_REUSABLE_SQL, (hash, hash_algorithm, fingerprint)
+        ).fetchone()
+
+    def fetch_signatures(self):
+        # path:(hash, hash_algorithm, size, mtime_ns, inode)
+        results = self.conn.execute(FETCH_SIGNATURES_SQL).fetchall()
+        return {result[0]: result[1:] for result in results}
+
+    def update_signatures(self, signatures):
+        """
+        Args:
+            signatures (list[tuple]): (size, mtime_ns, inode, path) of each picture.
+        """
+        if not signatures:
+            return
+        self.conn.executemany(UPDATE_SIGNATURE_SQL, signatures)
+        self.commit()
+
+    def rename_paths(self, renames):
+        """
+        Moves the results of renamed or moved pictures to their new path,
+        the results and the FTS index are left untouched.
+
+        Args:
+            renames (list[tuple]): (new_path, size, mtime_ns, inode, old_path) of
+                each picture.
+        """
+        if not renames:
+            return
+        self.conn.executemany(RENAME_SQL, renames)
+        self.commit()
 
     def insert(
         self,
@@ -193,25 +448,81 @@ class DB:
         object_confidence,
         OCR,
         ocr_confidence,
+        size=None,
+        mtime_ns=None,
+        inode=None,
+        hash_algorithm=LEGACY_HASH_ALGORITHM,
+        fingerprint=LEGACY_FINGERPRINT,
     ):
-        self.conn.execute(
-            INSERT_SQL,
-            (
-                hash,
-                path,
-                classification,
-                classification_confidence,
-                object,
-                object_confidence,
-                OCR,
-                ocr_confidence,
-            ),
+        self.insert_many(
+            [
+                (
+                    hash,
+                    path,
+                    classification,
+                    classification_confidence,
+                    object,
+                    object_confidence,
+                    OCR,
+                    ocr_confidence,
+                    size,
+                    mtime_ns,
+                    inode,
+                    hash_algorithm,
+                    fingerprint,
+                )
+            ]
         )
-        self.conn.commit()
+        self.commit()
+
+    def insert_many(self, rows):
+        """
+        Inserts or updates many pictures in one transaction.
+
+        Results are stored once per hash and fingerprint, each path points to
+        the results of its content.
+
+        Args:
+            rows (list[tuple]): (hash, path, classification, classification_confidence,
+                object, object_confidence, OCR, ocr_confidence, size, mtime_ns,
+                inode, hash_algorithm, fingerprint) of each picture.
+        """
+        if not rows:
+            return
+        self.conn.executemany(
+            INSERT_RESULT_SQL, [(row[0], *row[11:13], *row[2:8]) for row in rows]
+        )
+        self.conn.executemany(
+            INSERT_PATH_SQL,
+            [(row[1], row[0], *row[11:13], *row[8:11]) for row in rows],
+        )
+        self.uncommitted_rows += len(rows)
+        if self.uncommitted_rows >= self.commit_interval:
+            self.commit()
 
-    def remove(self, path):
-        self.conn.execute(REMOVE_SQL, (path,))
+    def commit(self):
         self.conn.commit()
+        self.uncommitted_rows = 0
+
+    def remove_many(self, paths):
+        """
+        Removes many pictures in one transaction, their results are left for
+        remove_orphan_results.
+        """
+        if not paths:
+            return
+        self.conn.executemany(REMOVE_SQL, [(path,) for path in paths])
+        self.commit()
+
+    def remove_orphan_results(self):
+        """
+        Removes results no path points to anymore, left behind by deleted or
+        changed pictures and by changed model settings.
+        """
+        cursor = self.conn.execute(REMOVE_ORPHANS_SQL)
+        self.commit()
+        return cursor.rowcount
 
     def close(self):
+        self.commit()
         self.conn.close()
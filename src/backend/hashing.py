@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import logging
+from pathlib import Path
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# read size for hashing files that are not decoded
+CHUNK_SIZE = 1024 * 1024
+
+# algorithm of hashes stored before the algorithm was recorded
+LEGACY_HASH_ALGORITHM = "md5"
+
+HASH_ALGORITHMS = {
+    "md5": hashlib.md5,
+    "blake2b": lambda: hashlib.blake2b(digest_size=16),
+}
+if xxhash is not None:
+    HASH_ALGORITHMS["xxh3_128"] = xxhash.xxh3_128
+
+DEFAULT_HASH_ALGORITHM = "xxh3_128" if xxhash is not None else "blake2b"
+
+
+def resolve_algorithm(algorithm: str | None = None):
+    """
+    Returns the algorithm to use, falling back to the default one when the
+    requested algorithm is unknown or its package is not installed.
+    """
+    if algorithm is None:
+        return DEFAULT_HASH_ALGORITHM
+    if algorithm not in HASH_ALGORITHMS:
+        logging.warning(
+            f"Hash algorithm {algorithm} not available, using {DEFAULT_HASH_ALGORITHM}"
+        )
+        return DEFAULT_HASH_ALGORITHM
+    return algorithm
+
+
+def hash_bytes(data, algorithm: str = DEFAULT_HASH_ALGORITHM):
+    hasher = HASH_ALGORITHMS[algorithm]()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def hash_file(path: Path, algorithm: str = DEFAULT_HASH_ALGORITHM):
+    """
+    Hashes a file in CHUNK_SIZE chunks through one reusable buffer, so memory
+    use does not depend on the file size.
+    """
+    hasher = HASH_ALGORITHMS[algorithm]()
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as file:
+        while True:
+            size = file.readinto(buffer)
+            if not size:
+                break
+            hasher.update(view[:size])
+    return hasher.hexdigest()
@@ -1,23 +1,28 @@
 # -*- coding: utf-8 -*-
 
-import hashlib
-import importlib.util
 import logging
+import multiprocessing
+import os
+import struct
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import cv2
 import numpy as np
-from PySide6.QtCore import QObject, QThread, Signal
-
-try:
-    from rapidocr_paddle import RapidOCR
-except ImportError:
-    from rapidocr_onnxruntime import RapidOCR
 
+from backend.hashing import hash_bytes, resolve_algorithm
+from backend.model_registry import CLASSIFICATION_MODELS, DETECTION_MODELS
+from backend.ocr_pool import RapidOCR, ocr_engine_pool
 from backend.resources.label_list import coco, image_net
-from backend.yolo import YOLO11, YOLO11Cls
+from backend.yolo import (
+    YOLO11,
+    YOLO11Cls,
+    profile_providers,
+    session_cache,
+    session_options_from_settings,
+)
 
 is_nuitka = "__compiled__" in globals()
 
@@ -26,21 +31,25 @@ if is_nuitka or getattr(sys, "frozen", False):
 else:
     models_dir = Path(__file__).resolve().parent.parent / "models"
 
+# model input sizes, used to decode images no larger than needed
+CLASSIFICATION_INPUT_SIZE = 224
+DETECTION_INPUT_SIZE = 640
+# number of images fed to the runtime per session run
+INFERENCE_BATCH_SIZE = 16
+# maximum number of decoded images held by a BatchIndexer at once
+MAX_IN_FLIGHT = 32
+# longest side of the image checked for text before OCR
+OCR_GATE_SIDE = 960
+# RapidOCR shrinks larger images to this longest side before reading them
+# (its Global.max_side_len), so they are decoded no larger
+OCR_MAX_SIDE = 2000
+OCR_GATE_SENSITIVITY = 0.5
+
 
 def classify(image: np.ndarray, model: str, threshold: float = 0.7):
-    match model:
-        case "YOLO11n":
-            YOLO11_path = models_dir / "yolo11n-cls.onnx"
-        case "YOLO11s":
-            YOLO11_path = models_dir / "yolo11s-cls.onnx"
-        case "YOLO11m":
-            YOLO11_path = models_dir / "yolo11m-cls.onnx"
-        case "YOLO11l":
-            YOLO11_path = models_dir / "yolo11l-cls.onnx"
-        case "YOLO11x":
-            YOLO11_path = models_dir / "yolo11x-cls.onnx"
-        case _:
-            return []
+    if model not in CLASSIFICATION_MODELS:
+        return []
+    YOLO11_path = models_dir / CLASSIFICATION_MODELS[model]
     yolo_cls = YOLO11Cls(YOLO11_path, conf_thres=threshold)
     class_ids, confidence = yolo_cls(image)
     if len(class_ids) == 0:
@@ -53,75 +62,6 @@ def classify(image: np.ndarray, model: str, threshold: float = 0.7):
     return result
 
 
-class ClassificationWorker(QObject):
-    finished = Signal()
-    progress = Signal(str)
-    result = Signal(list)
-
-    def __init__(
-        self,
-        image_list: list[Path],
-        classification_model: str,
-        classification_threshold: float,
-        **kwargs,
-    ):
-        super(ClassificationWorker, self).__init__()
-        self.image_list = image_list
-        self.model = classification_model
-        self.threshold = classification_threshold
-        self.kwargs = kwargs
-
-    def run(self):
-        try:
-            results = self.classify_batch(self.image_list, self.model, self.threshold)
-            self.result.emit(results)
-            self.finished.emit()
-        except Exception as e:
-            logging.error(e, exc_info=True)
-            self.finished.emit()
-
-    def classify_batch(
-        self, images: list[np.ndarray], model: str, threshold: float = 0.7
-    ):
-
-        match model:
-            case "YOLO11n":
-                YOLO11_path = models_dir / "yolo11n-cls.onnx"
-            case "YOLO11s":
-                YOLO11_path = models_dir / "yolo11s-cls.onnx"
-            case "YOLO11m":
-                YOLO11_path = models_dir / "yolo11m-cls.onnx"
-            case "YOLO11l":
-                YOLO11_path = models_dir / "yolo11l-cls.onnx"
-            case "YOLO11x":
-                YOLO11_path = models_dir / "yolo11x-cls.onnx"
-            case _:
-                return [[] for _ in images]
-
-        yolo_cls = YOLO11Cls(YOLO11_path, conf_thres=threshold)
-
-        total_images = self.kwargs["total_files"]
-        finished_files = self.kwargs["finished_files"]
-
-        results = []
-        for i, image in enumerate(images):
-            progress = f"Classification progress: {i+1+finished_files}/{total_images}"
-            self.progress.emit(progress)
-
-            class_ids, confidence = yolo_cls(image)
-            if len(class_ids) == 0:
-                results.append([])
-                continue
-            class_names = [image_net[class_id][1] for class_id in class_ids]
-            result = [
-                (class_name, confidence[class_names.index(class_name)])
-                for class_name in class_names
-            ]
-            results.append(result)
-
-        return results
-
-
 def object_detection(
     image: np.ndarray,
     model: str,
@@ -134,7 +74,7 @@ def object_detection(
     ):
         yolo = YOLO11(YOLO11_path, conf_threshold, iou_threshold)
         _, scores, class_ids = yolo(image)
-        if not class_ids:
+        if len(class_ids) == 0:
             return []
         class_names = [class_name_list[class_id] for class_id in class_ids]
         return [
@@ -142,18 +82,11 @@ def object_detection(
             for class_name in class_names
         ]
 
-    model_paths = {
-        "YOLO11n": ["yolo11n.onnx"],
-        "YOLO11s": ["yolo11s.onnx"],
-        "YOLO11m": ["yolo11m.onnx"],
-        "YOLO11l": ["yolo11l.onnx"],
-        "YOLO11x": ["yolo11x.onnx"],
-    }
     datasets = {
         "COCO": coco,
     }
 
-    if model not in model_paths:
+    if model not in DETECTION_MODELS:
         return []
 
     yolo_paths = []
@@ -161,7 +94,7 @@ def object_detection(
     for dataset_name in dataset:
         if dataset_name in datasets:
             if dataset_name == "COCO":
-                yolo_paths.append(models_dir / model_paths[model][0])
+                yolo_paths.append(models_dir / DETECTION_MODELS[model])
             class_name_lists.append(datasets[dataset_name])
 
     result = []
@@ -175,110 +108,63 @@ def object_detection(
     return result
 
 
-class ObjectDetectionWorker(QObject):
-    finished = Signal()
-    progress = Signal(str)
-    result = Signal(list)
+# hashes whose results were stored before the run, read_img skips their
+# inference in this process
+known_hashes = set()
 
-    def __init__(
-        self,
-        image_list: list[Path],
-        object_detection_model: str,
-        object_detection_dataset: list[str],
-        object_detection_conf_threshold: float,
-        object_detection_iou_threshold: float,
-        **kwargs,
-    ):
-        super(ObjectDetectionWorker, self).__init__()
-        self.image_list = image_list
-        self.model = object_detection_model
-        self.dataset = object_detection_dataset
-        self.conf_threshold = object_detection_conf_threshold
-        self.iou_threshold = object_detection_iou_threshold
-        self.kwargs = kwargs
-
-    def run(self):
-        try:
-            results = self.object_detection_batch(
-                self.image_list,
-                self.model,
-                self.dataset,
-                self.conf_threshold,
-                self.iou_threshold,
-            )
-            self.result.emit(results)
-            self.finished.emit()
-        except Exception as e:
-            logging.error(e, exc_info=True)
-            self.finished.emit()
-
-    def object_detection_batch(
-        self,
-        images: list[np.ndarray],
-        model: str,
-        dataset: list[str],
-        conf_threshold: float = 0.7,
-        iou_threshold: float = 0.5,
-    ):
-        yolo_path = []
-        class_name_list_list = []
-        model_paths = {
-            "YOLO11n": ["yolo11n.onnx"],
-            "YOLO11s": ["yolo11s.onnx"],
-            "YOLO11m": ["yolo11m.onnx"],
-            "YOLO11l": ["yolo11l.onnx"],
-            "YOLO11x": ["yolo11x.onnx"],
-        }
-        datasets = {
-            "COCO": coco,
-        }
-
-        if model in model_paths:
-            for dataset_name in dataset:
-                if dataset_name == "COCO":
-                    yolo_path.append(models_dir / model_paths[model][0])
-                    class_name_list_list.append(datasets[dataset_name])
-        else:
-            return [[] for _ in images]
-
-        results = []
-        yolo_list = []
-        for i, YOLO11_path in enumerate(yolo_path):
-            yolo_list.append(YOLO11(YOLO11_path, conf_threshold, iou_threshold))
-
-        total_images = self.kwargs["total_files"]
-        finished_files = self.kwargs["finished_files"]
-
-        for i, image in enumerate(images):
-            progress = f"Object detection progress: {i+1+finished_files}/{total_images}"
-            self.progress.emit(progress)
-            result = []
-            for yolo, class_name_list in zip(yolo_list, class_name_list_list):
-                _, scores, class_ids = yolo(image)
-                if len(class_ids) == 0:
-                    continue
-                class_names = [class_name_list[class_id] for class_id in class_ids]
-                result.extend(
-                    [
-                        (class_name, scores[class_names.index(class_name)])
-                        for class_name in class_names
-                    ]
-                )
-            results.append(result)
-        return results
-
-
-def OCR(image: np.ndarray, model: str):
-    if model == "RapidOCR":
 
-        if importlib.util.find_spec("rapidocr_paddle") is not None:
-            engine = RapidOCR(det_use_cuda=True, cls_use_cuda=True, rec_use_cuda=True)
-        else:
-            engine = RapidOCR(
-                det_use_cuda=False, cls_use_cuda=False, rec_use_cuda=False
-            )
+def ocr_gate_sensitivity(**kwargs):
+    """
+    Returns the sensitivity of the OCR text gate, None when it is disabled.
+    """
+    if not kwargs.get("ocr_gate", False):
+        return None
+    return float(kwargs.get("ocr_gate_sensitivity", OCR_GATE_SENSITIVITY))
+
+
+def has_text(engine: RapidOCR, image: np.ndarray, sensitivity: float):
+    """
+    Checks an image for text with only the text detection of RapidOCR, run on
+    a copy downscaled to OCR_GATE_SIDE. The direction classification and the
+    recognition, most of the OCR time, are skipped for images without text.
+
+    Args:
+        engine (RapidOCR): Engine borrowed from the pool.
+        image (np.ndarray): The image.
+        sensitivity (float): From 0 to 1, higher keeps fainter text regions.
+
+    Returns:
+        bool: Whether text regions were found.
+    """
+    scale = OCR_GATE_SIDE / max(image.shape[:2])
+    if scale < 1:
+        image = cv2.resize(
+            image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+        )
+    # the engine is borrowed by this thread only, restore its threshold after
+    postprocess = engine.text_det.postprocess_op
+    box_thresh = postprocess.box_thresh
+    postprocess.box_thresh = 1 - sensitivity
+    try:
+        boxes, _ = engine.text_det(image)
+    finally:
+        postprocess.box_thresh = box_thresh
+    return boxes is not None and len(boxes) > 0
 
-        result, elapse = engine(image, use_det=True, use_cls=True, use_rec=True)
+
+def OCR(image: np.ndarray, model: str, gate_sensitivity: float | None = None):
+    """
+    Returns the (text, confidence) results of OCR, or None when the image was
+    skipped by the text gate.
+    """
+    if model == "RapidOCR":
+        # the engines are created once per process and reused
+        with ocr_engine_pool.engine() as engine:
+            if gate_sensitivity is not None and not has_text(
+                engine, image, gate_sensitivity
+            ):
+                return None
+            result, elapse = engine(image, use_det=True, use_cls=True, use_rec=True)
         if result is None or len(result) == 0:
             return []
 
@@ -289,72 +175,6 @@ def OCR(image: np.ndarray, model: str):
         return []
 
 
-class OCRWorker(QObject):
-    finished = Signal()
-    progress = Signal(str)
-    result = Signal(list)
-
-    def __init__(self, image_list: list[np.ndarray], OCR_model: str, **kwargs):
-        super(OCRWorker, self).__init__()
-        self.image_list = image_list
-        self.model = OCR_model
-        self.kwargs = kwargs
-
-    def run(self):
-        try:
-            results = self.OCR_batch(self.image_list, self.model)
-            self.result.emit(results)
-            self.finished.emit()
-        except Exception as e:
-            logging.error(e, exc_info=True)
-            self.finished.emit()
-
-    def OCR_batch(self, images: list[np.ndarray], model: str):
-        if model == "RapidOCR":
-            # if using paddle OCR
-            if importlib.util.find_spec("rapidocr_paddle") is not None:
-                engine = RapidOCR(
-                    det_use_cuda=True, cls_use_cuda=True, rec_use_cuda=True
-                )
-            else:
-                engine = RapidOCR(
-                    det_use_cuda=False, cls_use_cuda=False, rec_use_cuda=False
-                )
-
-            total_images = self.kwargs["total_files"]
-            finished_files = self.kwargs["finished_files"]
-
-            results = []
-            for i, image in enumerate(images):
-                progress = f"OCR progress: {i+1+finished_files}/{total_images}"
-                self.progress.emit(progress)
-                try:
-                    result, elapse = engine(
-                        image, use_det=True, use_cls=True, use_rec=True
-                    )
-                except Exception as e:
-                    path_list = self.kwargs.get("path_list", [])
-                    if len(path_list) > i:
-                        logging.error(
-                            f"Image: {path_list[i]}, OCR failed. Error:{e}",
-                            exc_info=True,
-                        )
-                    else:
-                        logging.error(
-                            f"Image Index:{i}, OCR failed. Error:{e}", exc_info=True
-                        )
-                    results.append([])
-                    continue
-                if result is None or len(result) == 0:
-                    results.append([])
-                    continue
-                res = [(i[1], i[2]) for i in result]
-                results.append(res)
-            return results
-        else:
-            return [[] for _ in images]
-
-
 # %%
 def read_img(
     img_path: Path,
@@ -369,21 +189,30 @@ def read_img(
 ):
     try:
 
-        with open(img_path, "rb") as file:
-            img_file = file.read()
-            # get md5 hash of image
-            img_hash = hashlib.md5(img_file).hexdigest()
-
-        # read image with cv2
-        try:
-            img = cv2.imread(img_path.as_posix())
-            assert isinstance(img, np.ndarray)
-        except Exception as e:
-            return {"error": str(e)}
+        # read the file once for the md5 hash and cv2
+        min_size = None
+        if kwargs.get("reduced_decode", True):
+            min_size = decode_min_size(
+                classification_model, object_detection_model, OCR_model
+            )
+        hash_algorithm = resolve_algorithm(kwargs.get("hash_algorithm"))
+        img_file, img_hash, signature = read_file(img_path, hash_algorithm)
 
         res_dict = {}
         res_dict["hash"] = img_hash
+        res_dict["hash_algorithm"] = hash_algorithm
         res_dict["path"] = img_path.as_posix()
+        res_dict["signature"] = signature
+
+        if img_hash in known_hashes:
+            # results are copied from the indexed duplicate
+            res_dict["duplicate"] = True
+            return res_dict
+
+        img = decode_image(img_file, img_path, min_size)
+        del img_file
+        if img is None:
+            return {"error": f"Image:{img_path.as_posix()}, cv2 read failed"}
 
         if classification_model != "None":
             cls_start = time.perf_counter()
@@ -416,7 +245,10 @@ def read_img(
         if OCR_model != "None":
             OCR_start = time.perf_counter()
 
-            OCR_res = OCR(img, OCR_model)
+            OCR_res = OCR(img, OCR_model, ocr_gate_sensitivity(**kwargs))
+            if OCR_res is None:
+                res_dict["OCR_skipped"] = True
+                OCR_res = []
             res_dict["OCR"] = OCR_res
 
             OCR_end = time.perf_counter()
@@ -433,234 +265,212 @@ def read_img_warper(args: tuple):
     return read_img(path, **kwargs)
 
 
-class ReadImgWorker(QObject):
-    finished = Signal()
-    progress = Signal(str)
-    results = Signal(list)
-
-    def __init__(self, image_list: list[Path], **kwargs):
-        super(ReadImgWorker, self).__init__()
-        self.image_list = image_list
-        self.kwargs = kwargs
-        self.progress_dict = {}
-        self.result_list = []
-        self.worker_flags = {}
-        self.worker_flags["hash"] = False
-        self.worker_flags["classification"] = False
-        self.worker_flags["object_detection"] = False
-        self.worker_flags["OCR"] = False
-        self.kwargs["path_list"] = image_list
-
-    def run(self):
-        # start hashing and reading images
-        self.start_hash_read()
-
-    def start_hash_read(self):
-        self.hash_worker = HashReadWorker(self.image_list)
-        self.hash_worker_thread = QThread(parent=self)
-        self.hash_worker.moveToThread(self.hash_worker_thread)
-        self.hash_worker_thread.started.connect(self.hash_worker.run)
-        self.hash_worker.hash_result.connect(self.hash_result)
-        self.hash_worker.img_result.connect(self.img_result)
-        self.hash_worker.finished.connect(self.hash_finished)
-        self.hash_worker.progress.connect(self.progress_process)
-        self.worker_flags["hash"] = True
-        self.hash_worker_thread.start()
-
-    def hash_result(self, hash: list[str]):
-        self.hashes = hash
-
-    def img_result(self, img: list[np.ndarray]):
-        self.imgs = img
-
-    def hash_finished(self):
-        # wait for hash read to finish
-        self.hash_worker_thread.quit()
-        self.hash_worker_thread.wait()
-        self.hash_worker_thread.deleteLater()
-        self.worker_flags["hash"] = False
-
-        # start reading images
-        if self.kwargs["classification_model"] != "None":
-            self.start_classify_read()
-        if self.kwargs["object_detection_model"] != "None":
-            self.start_obj_read()
-        if self.kwargs["OCR_model"] != "None":
-            self.start_OCR_read()
-
-    def start_classify_read(self):
-        self.classify_worker = ClassificationWorker(self.imgs, **self.kwargs)
-        self.classify_worker_thread = QThread(parent=self)
-        self.classify_worker.moveToThread(self.classify_worker_thread)
-        self.classify_worker_thread.started.connect(self.classify_worker.run)
-        self.classify_worker.result.connect(self.classify_result)
-        self.classify_worker.finished.connect(self.classify_finished)
-        self.classify_worker.progress.connect(self.progress_process)
-        self.worker_flags["classification"] = True
-        self.classify_worker_thread.start()
-
-    def start_obj_read(self):
-        self.obj_worker = ObjectDetectionWorker(self.imgs, **self.kwargs)
-        self.obj_worker_thread = QThread(parent=self)
-        self.obj_worker.moveToThread(self.obj_worker_thread)
-        self.obj_worker_thread.started.connect(self.obj_worker.run)
-        self.obj_worker.result.connect(self.obj_result)
-        self.obj_worker.finished.connect(self.obj_finished)
-        self.obj_worker.progress.connect(self.progress_process)
-        self.worker_flags["object_detection"] = True
-        self.obj_worker_thread.start()
-
-    def start_OCR_read(self):
-        self.OCR_worker = OCRWorker(self.imgs, **self.kwargs)
-        self.OCR_worker_thread = QThread(parent=self)
-        self.OCR_worker.moveToThread(self.OCR_worker_thread)
-        self.OCR_worker_thread.started.connect(self.OCR_worker.run)
-        self.OCR_worker.result.connect(self.OCR_result)
-        self.OCR_worker.finished.connect(self.OCR_finished)
-        self.OCR_worker.progress.connect(self.progress_process)
-        self.worker_flags["OCR"] = True
-        self.OCR_worker_thread.start()
-
-    def classify_finished(self):
-        self.classify_worker_thread.quit()
-        self.classify_worker_thread.wait()
-        logging.debug("Classification finished")
-        self.worker_flags["classification"] = False
-        self.check_worker_finished()
-
-    def obj_finished(self):
-        self.obj_worker_thread.quit()
-        self.obj_worker_thread.wait()
-        logging.debug("Object detection finished")
-        self.worker_flags["object_detection"] = False
-        self.check_worker_finished()
-
-    def OCR_finished(self):
-        self.OCR_worker_thread.quit()
-        self.OCR_worker_thread.wait()
-        logging.debug("OCR finished")
-        self.worker_flags["OCR"] = False
-        self.check_worker_finished()
-
-    def check_worker_finished(self):
+def runtime_settings(**kwargs):
+    """
+    Returns the (session_options, providers, optimized_model_dir) of the
+    onnxruntime settings, as taken by SessionCache.configure.
+    """
+    optimized_model_dir = None
+    if kwargs.get("save_optimized_models", False):
+        optimized_model_dir = models_dir / "optimized"
+    return (
+        session_options_from_settings(kwargs),
+        profile_providers(kwargs.get("provider_profile")),
+        optimized_model_dir,
+    )
+
+
+def init_process_worker(
+    threads: int, hashes: set | None = None, runtime: tuple | None = None
+):
+    """
+    Initializer of the indexing process pool.
+
+    Limits the onnxruntime and cv2 thread pools of the process so that the
+    workers together don't use more threads than there are cores.
+    hashes are the hashes stored before the run, runtime the onnxruntime
+    settings of process_pool.
+    """
+    global known_hashes
+    known_hashes = hashes or set()
+    session_cache.configure(*(runtime or ({}, None, None)))
+    # read_img runs one image at a time in each process
+    ocr_engine_pool.configure(1, threads)
+    cv2.setNumThreads(threads)
+
+
+def process_pool(
+    workers: int = 0, known_hashes: set | None = None, runtime: tuple | None = None
+):
+    """
+    Creates the process pool used by ProcessBatchIndexer.
+
+    Args:
+        workers (int, optional): Number of processes, 0 for half of the cores.
+        known_hashes (set, optional): Hashes stored before the run, their
+            duplicates skip inference. Later duplicates are found by
+            ProcessBatchIndexer when their results return.
+        runtime (tuple, optional): onnxruntime settings, as returned by runtime_settings.
+
+    Returns:
+        ProcessPoolExecutor: The process pool.
+    """
+    session_options, providers, optimized_model_dir = runtime or ({}, None, None)
+    cpu_count = os.cpu_count() or 1
+    if workers <= 0:
+        workers = max(1, cpu_count // 2)
+    threads = max(1, cpu_count // workers)
+    # threads set in the settings cap the threads of each process
+    threads = min(threads, session_options.get("intra_op_num_threads") or threads)
+    session_options = {
+        "inter_op_num_threads": 1,
+        **session_options,
+        "intra_op_num_threads": threads,
+    }
+    logging.info(f"Starting {workers} indexing processes, {threads} threads each")
+    # spawn, forking a process with running Qt threads is not safe
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_process_worker,
+        initargs=(
+            threads,
+            known_hashes,
+            (session_options, providers, optimized_model_dir),
+        ),
+    )
+
+
+def image_size(file_bytes: bytes):
+    """
+    Reads the (width, height) of a JPEG or PNG image from its header.
+
+    Returns:
+        tuple | None: The image size, None for other formats or broken headers.
+    """
+    if file_bytes[:8] == b"\x89PNG\r\n\x1a\n" and file_bytes[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", file_bytes[16:24])
+        return width, height
+    if file_bytes[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 4 <= len(file_bytes):
+        if file_bytes[pos] != 0xFF:
+            return None
+        marker = file_bytes[pos + 1]
+        if marker == 0xFF:
+            # fill byte
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            # markers without a length
+            pos += 2
+            continue
+        (length,) = struct.unpack(">H", file_bytes[pos + 2 : pos + 4])
+        # SOF0-SOF15 except DHT, JPG and DAC
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if pos + 9 > len(file_bytes):
+                return None
+            height, width = struct.unpack(">HH", file_bytes[pos + 5 : pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def decode_flag(file_bytes: bytes, min_size: tuple | None):
+    """
+    Picks the cv2 imread flag that decodes the image as small as possible while
+    its shorter and longer sides stay at least the (short, long) of min_size.
+
+    JPEG images are scaled by the decoder (DCT scaling), so this cuts decode time
+    as well as memory. min_size None decodes at full resolution.
+    """
+    if min_size is None:
+        return cv2.IMREAD_COLOR
+    size = image_size(file_bytes)
+    if size is None:
+        return cv2.IMREAD_COLOR
+    short_side, long_side = sorted(size)
+    min_short_side, min_long_side = min_size
+    for factor, flag in (
+        (8, cv2.IMREAD_REDUCED_COLOR_8),
+        (4, cv2.IMREAD_REDUCED_COLOR_4),
+        (2, cv2.IMREAD_REDUCED_COLOR_2),
+    ):
         if (
-            self.worker_flags["classification"] == False
-            and self.worker_flags["object_detection"] == False
-            and self.worker_flags["OCR"] == False
+            short_side // factor >= min_short_side
+            and long_side // factor >= min_long_side
         ):
-            self.result_emit()
-
-    def result_emit(self):
-
-        for i, img_path in enumerate(self.image_list):
-            result_dict = {}
-            result_dict["hash"] = self.hashes[i]
-            result_dict["path"] = img_path
-
-            try:
-                result_dict["classification"] = self.classify_res[i]
-            except AttributeError:
-                result_dict["classification"] = []
-            except IndexError:
-                result_dict["classification"] = []
-                logging.error(
-                    f"Classification failed for image:{img_path.as_posix()}",
-                    exc_info=True,
-                )
-
-            try:
-                result_dict["object_detection"] = self.obj_res[i]
-            except AttributeError:
-                result_dict["object_detection"] = []
-            except IndexError:
-                result_dict["object_detection"] = []
-                logging.error(
-                    f"Object Detection failed for image:{img_path.as_posix()}",
-                    exc_info=True,
-                )
-
-            try:
-                result_dict["OCR"] = self.OCR_res[i]
-            except AttributeError:
-                result_dict["OCR"] = []
-            except IndexError:
-                result_dict["OCR"] = []
-                logging.error(
-                    f"OCR failed for image:{img_path.as_posix()}",
-                    exc_info=True,
-                )
-
-            self.result_list.append(result_dict)
-
-        self.results.emit(self.result_list)
-        self.finished.emit()
-
-    def classify_result(self, result: list):
-        self.classify_res = result
-
-    def obj_result(self, result: list):
-        self.obj_res = result
-
-    def OCR_result(self, result: list):
-        self.OCR_res = result
-
-    def progress_process(self, progress: str):
-        if progress.startswith("Classification"):
-            self.progress_dict["Classification"] = progress
-        elif progress.startswith("Object detection"):
-            self.progress_dict["Object detection"] = progress
-        elif progress.startswith("OCR"):
-            self.progress_dict["OCR"] = progress
-
-        progress_str = ", ".join(self.progress_dict.values())
-        self.progress.emit(progress_str)
-
-
-class HashReadWorker(QObject):
-    finished = Signal()
-    progress = Signal(str)
-    hash_result = Signal(list)
-    img_result = Signal(list)
-
-    def __init__(self, file_paths: list[Path]):
-        super(HashReadWorker, self).__init__()
-        self.file_paths = file_paths
-
-    def run(self):
-        try:
-            hash_list = []
-            img_list = []
-            for i, file_path in enumerate(self.file_paths):
-                self.progress.emit(i + 1)
-                try:
-                    with open(file_path, "rb") as file:
-                        file_bytes = file.read()
-                        hash = hashlib.md5(file_bytes).hexdigest()
-                        try:
-                            img = cv2.imdecode(
-                                np.frombuffer(file_bytes, np.uint8),
-                                cv2.IMREAD_COLOR,
-                            )
-                            if not isinstance(img, np.ndarray):
-                                img = np.zeros((100, 100, 3), dtype=np.uint8)
-                                logging.error(
-                                    f"Image:{file_path.as_posix()}, cv2 read failed",
-                                    exc_info=True,
-                                )
-                        except Exception as e:
-                            img = np.zeros((100, 100, 3), dtype=np.uint8)
-                            logging.error(
-                                f"Image:{file_path.as_posix()}, cv2 read failed",
-                                exc_info=True,
-                            )
-                    hash_list.append(hash)
-                    img_list.append(img)
-                except Exception as e:
-                    logging.error(e, exc_info=True)
-                    continue
-            self.hash_result.emit(hash_list)
-            self.img_result.emit(img_list)
-            self.finished.emit()
-        except Exception as e:
-            logging.error(e, exc_info=True)
-            self.finished.emit()
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_min_size(
+    classification_model="None", object_detection_model="None", OCR_model="None"
+):
+    """
+    Smallest (shorter side, longer side) of the decoded image that still
+    covers every enabled model. The YOLO models need their input size on the
+    shorter side, OCR the resolution RapidOCR reads at on the longer side.
+    """
+    min_short_side = 0
+    if classification_model != "None":
+        min_short_side = max(min_short_side, CLASSIFICATION_INPUT_SIZE)
+    if object_detection_model != "None":
+        min_short_side = max(min_short_side, DETECTION_INPUT_SIZE)
+    min_long_side = OCR_MAX_SIDE if OCR_model != "None" else 0
+    return min_short_side, min_long_side
+
+
+def file_signature(stat: os.stat_result):
+    """
+    (size, mtime_ns, inode) of a file, used to detect changed files without
+    hashing them. inode is None where the platform doesn't provide one.
+    """
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino or None)
+
+
+def read_file(file_path: Path, hash_algorithm: str | None = None):
+    """
+    Reads a file once, the bytes are reused for decoding.
+
+    Args:
+        file_path (Path): The image file.
+        hash_algorithm (str, optional): See backend.hashing. Defaults to the fastest available.
+
+    Returns:
+        tuple: The file bytes, their hash and the file signature at the time it was read.
+    """
+    with open(file_path, "rb") as file:
+        signature = file_signature(os.fstat(file.fileno()))
+        file_bytes = file.read()
+    hash = hash_bytes(file_bytes, resolve_algorithm(hash_algorithm))
+    return file_bytes, hash, signature
+
+
+def decode_image(file_bytes: bytes, file_path: Path, min_size: tuple | None = None):
+    """
+    Decodes image file bytes with cv2.
+
+    Args:
+        file_bytes (bytes): The image file content.
+        file_path (Path): The image file, for error messages.
+        min_size (tuple, optional): Decode reduced, see decode_flag. Defaults to full resolution.
+
+    Returns:
+        numpy.ndarray | None: The BGR image, None if cv2 can't decode it.
+    """
+    try:
+        img = cv2.imdecode(
+            np.frombuffer(file_bytes, np.uint8), decode_flag(file_bytes, min_size)
+        )
+        if not isinstance(img, np.ndarray):
+            img = None
+            logging.error(f"Image:{file_path.as_posix()}, cv2 read failed")
+    except Exception as e:
+        img = None
+        logging.error(
+            f"Image:{file_path.as_posix()}, cv2 read failed. Error:{e}",
+            exc_info=True,
+        )
+    return img
@@ -0,0 +1,675 @@
+# -*- coding: utf-8 -*-
+"""
+Indexing of a folder, without Qt.
+
+Indexer runs the scan and the batches on plain threads. Their reports are
+handled in the thread that called Indexer.run, which owns the database
+connection and calls on_progress.
+"""
+
+import logging
+import posixpath
+import queue
+import threading
+from pathlib import Path
+
+from backend.db_ops import DB, model_fingerprint
+from backend.hashing import (
+    HASH_ALGORITHMS,
+    LEGACY_HASH_ALGORITHM,
+    hash_file,
+    resolve_algorithm,
+)
+from backend.image_process import (
+    models_dir,
+    ocr_gate_sensitivity,
+    process_pool,
+    runtime_settings,
+)
+from backend.model_registry import (
+    CLASSIFICATION_MODELS,
+    DETECTION_MODELS,
+    quantized_model,
+)
+from backend.ocr_pool import ocr_engine_pool
+from backend.pipeline import BatchIndexer, HashClaims, ProcessBatchIndexer, ignore
+from backend.scanner import SCAN_THREADS, scan_files
+from backend.scheduler import ThreadBudget
+from backend.yolo import cpu_only, session_cache
+
+
+class FolderScan:
+    """
+    Walks the folder for the files to index: new files, and indexed files
+    whose content changed.
+
+    The files are reported in groups while the walk is still running. Indexed
+    files that only got a new signature, renamed files and deleted files are
+    returned at the end, for Indexer to update in the database.
+
+    Given directories, only their files are scanned, not those of their
+    subdirectories, as for the changes reported by FolderWatcher. The files
+    under a given directory that no longer exists are deleted.
+    """
+
+    def __init__(
+        self,
+        folder_path: Path,
+        existing_entries: dict,
+        full_update: bool = False,
+        threads: int = SCAN_THREADS,
+        directories: list | None = None,
+    ):
+        self.folder = folder_path
+        self.existing_entries = existing_entries
+        self.full_update = full_update
+        self.threads = threads
+        self.directories = directories
+
+    def run(self, on_found=ignore):
+        """
+        Args:
+            on_found (callable, optional): Called with each list of files to
+                index.
+
+        Returns:
+            tuple: The (size, mtime_ns, inode, path) of the files whose
+                signature changed but not their content, the renames and the
+                deleted paths.
+        """
+        # files whose content did not change, only their signature is updated
+        unchanged_signatures = []
+        renames = []
+        deleted = []
+        try:
+            seen, failed = self.scan(unchanged_signatures, renames, on_found)
+            deleted = self.deleted_files(seen, failed, renames)
+        except Exception as e:
+            logging.error(e, exc_info=True)
+        return unchanged_signatures, renames, deleted
+
+    def scan(self, unchanged_signatures: list, renames: list, on_found):
+        """
+        Returns:
+            tuple: The set of the relative paths of all files found, and the
+                paths that could not be read.
+        """
+        # indexed files by signature, a new path with the signature of a missing
+        # file is the same file renamed or moved
+        renamed_candidates = {
+            tuple(entry[2:]): path
+            for path, entry in self.existing_entries.items()
+            if entry[4] is not None
+        }
+        seen = set()
+        failed = []
+
+        for files in scan_files(self.folder, self.threads, failed, self.directories):
+            found = []
+            for file, signature in files:
+                rel_path = file.relative_to(self.folder).as_posix()
+                seen.add(rel_path)
+                if self.full_update:
+                    found.append(file)
+                    continue
+                if rel_path in self.existing_entries:
+                    existing_hash, algorithm, *existing_signature = (
+                        self.existing_entries[rel_path]
+                    )
+                    if self.signature_unchanged(existing_signature, signature):
+                        continue
+                    # only hash files whose signature changed, with the
+                    # algorithm the stored hash was made with
+                    algorithm = algorithm or LEGACY_HASH_ALGORITHM
+                    if algorithm not in HASH_ALGORITHMS:
+                        found.append(file)
+                        continue
+                    file_hash = hash_file(file, algorithm)
+                    if file_hash == existing_hash:
+                        unchanged_signatures.append((*signature, rel_path))
+                    else:
+                        found.append(file)
+                else:
+                    old_path = renamed_candidates.get(signature)
+                    if (
+                        signature[2] is not None
+                        and old_path is not None
+                        and not (self.folder / old_path).exists()
+                    ):
+                        logging.info(f"Moving {old_path} to {rel_path} in database")
+                        del renamed_candidates[signature]
+                        renames.append((rel_path, *signature, old_path))
+                        continue
+                    found.append(file)
+            if found:
+                on_found(found)
+        return seen, failed
+
+    def deleted_files(self, seen: set, failed: list, renames: list):
+        """
+        Returns the indexed paths the scan did not find, except those under
+        paths that could not be read, which may still exist.
+        """
+        deleted = self.existing_entries.keys() - seen
+        if self.directories is not None:
+            # only the files of the scanned directories are known to be gone,
+            # and all files under those that no longer exist
+            scanned = {self.relative_dir(directory) for directory in self.directories}
+            removed = [
+                self.relative_dir(directory)
+                for directory in self.directories
+                if not Path(directory).is_dir()
+            ]
+            deleted = {
+                path
+                for path in deleted
+                if posixpath.dirname(path) in scanned or self.under(path, removed)
+            }
+        # moved to their new path
+        deleted -= {rename[-1] for rename in renames}
+        if failed:
+            unreadable = []
+            for path in failed:
+                rel_path = Path(path).relative_to(self.folder).as_posix()
+                if rel_path == ".":
+                    return []
+                unreadable.append(rel_path)
+            deleted = {path for path in deleted if not self.under(path, unreadable)}
+        return sorted(deleted)
+
+    def under(self, path: str, prefixes: list):
+        return any(
+            path == prefix or path.startswith(prefix + "/") for prefix in prefixes
+        )
+
+    def relative_dir(self, directory):
+        rel_dir = Path(directory).relative_to(self.folder).as_posix()
+        # dirname of the files in the folder itself
+        return "" if rel_dir == "." else rel_dir
+
+    def signature_unchanged(self, existing_signature, signature):
+        size, mtime_ns, inode = existing_signature
+        if size is None or mtime_ns is None:
+            # indexed before signatures were stored
+            return False
+        if inode is not None and signature[2] is not None and inode != signature[2]:
+            return False
+        return (size, mtime_ns) == signature[:2]
+
+
+class Indexer:
+    """
+    Indexes the new and changed pictures of a folder into its database.
+
+    The folder is scanned while the first batches are indexed, and the next
+    batch is read while up to prefetch_depth batches are in the models. run
+    returns once everything is indexed, or on an error, which sets failed.
+
+    Args:
+        folder_path (Path): The folder to index.
+        on_progress (callable, optional): Called with progress messages, in
+            the thread running run.
+        **kwargs: The index settings.
+    """
+
+    def __init__(self, folder_path: Path, on_progress=ignore, **kwargs):
+        self.folder = folder_path
+        self.on_progress = on_progress
+        self.kwargs = kwargs
+
+        self.batch_size = kwargs["batch_size"]
+        # start of the next batch to read
+        self.index = 0
+        # batches indexed at once, the next batch is read while the previous
+        # ones are in the models
+        self.prefetch_depth = max(1, kwargs.get("prefetch_depth", 2))
+        # reports of the scan and the batches, handled by run
+        self.events = queue.Queue()
+        self.batches = {}
+        self.reading = set()
+        self.file_list = []
+        self.total_files = 0
+        # files whose results were handled
+        self.indexed_files = 0
+        self.scanning = False
+        self.stopping = False
+        # set when run stopped on an error
+        self.failed = False
+        self.db = None
+        self.pool = None
+        self.scheduler = None
+        self.bulk_load = False
+        # images whose results were copied from a duplicate
+        self.duplicates = 0
+        # of them, those inferred before their hash was found to be claimed
+        self.inferred_duplicates = 0
+        # hashes whose results are stored, and the duplicates waiting for the
+        # results of their first copy
+        self.stored_hashes = set()
+        self.held_duplicates = {}
+        # images read by OCR, and those of them skipped by the text gate
+        self.ocr_checked = 0
+        self.ocr_skipped = 0
+
+    def run(self):
+        try:
+            db_path = self.folder / "PicFinder.db"
+            self.db = DB(db_path, commit_interval=self.kwargs.get("commit_interval", 1))
+            self.runtime = runtime_settings(**self.kwargs)
+            if self.kwargs.get("index_backend", "threads") == "threads":
+                self.use_thread_budget()
+            session_cache.configure(*self.runtime)
+            if self.kwargs.get("quantized_models", True) and cpu_only(self.runtime[1]):
+                self.use_quantized_models()
+
+            self.db.add_history(
+                classification_model=self.kwargs["classification_model"],
+                classification_threshold=self.kwargs["classification_threshold"],
+                object_detection_model=self.kwargs["object_detection_model"],
+                object_detection_dataset=self.kwargs["object_detection_dataset"],
+                object_detection_confidence=self.kwargs[
+                    "object_detection_conf_threshold"
+                ],
+                object_detection_iou=self.kwargs["object_detection_iou_threshold"],
+                OCR_model=self.kwargs["OCR_model"],
+                full_update=self.kwargs["FullUpdate"],
+            )
+            # results are stored and reused per content hash and model settings
+            self.fingerprint = model_fingerprint(
+                self.kwargs["classification_model"],
+                self.kwargs["classification_threshold"],
+                self.kwargs["object_detection_model"],
+                self.kwargs["object_detection_dataset"],
+                self.kwargs["object_detection_conf_threshold"],
+                self.kwargs["object_detection_iou_threshold"],
+                self.kwargs["OCR_model"],
+                ocr_gate_sensitivity(**self.kwargs),
+            )
+
+            self.read_folder(self.folder)
+            self.handle_events()
+            self.full_finished()
+        except Exception as e:
+            logging.error(e, exc_info=True)
+            self.failed = True
+            self.close_after_error()
+
+    def close_after_error(self):
+        # keep the rows saved before the error
+        self.stopping = True
+        try:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+            if self.db is not None:
+                if self.bulk_load:
+                    self.db.end_bulk_load()
+                    self.bulk_load = False
+                self.db.close()
+                self.db = None
+        except Exception as e:
+            logging.error(e, exc_info=True)
+
+    def stop(self):
+        """
+        Stops starting batches, run returns once the running ones are done.
+        Can be called from any thread.
+        """
+        self.stopping = True
+
+    def use_thread_budget(self):
+        # the model stages share the budget instead of each using all cores
+        session_options, providers, optimized_model_dir = self.runtime
+        self.scheduler = ThreadBudget(
+            self.kwargs.get("thread_budget", 0),
+            session_options.get("intra_op_num_threads", 0),
+        )
+        self.kwargs["scheduler"] = self.scheduler
+        session_options = {
+            "inter_op_num_threads": 1,
+            **session_options,
+            "intra_op_num_threads": self.scheduler.threads_per_call,
+        }
+        self.runtime = (session_options, providers, optimized_model_dir)
+        ocr_engine_pool.configure(
+            self.kwargs.get("ocr_concurrency", 0) or self.scheduler.slots,
+            self.scheduler.threads_per_call,
+        )
+        logging.info(
+            f"Sharing {self.scheduler.threads} inference threads, "
+            f"{self.scheduler.threads_per_call} per model call"
+        )
+
+    def use_quantized_models(self):
+        # INT8 variants are faster on CPUs, accelerators run the fp32 models
+        for key, models in (
+            ("classification_model", CLASSIFICATION_MODELS),
+            ("object_detection_model", DETECTION_MODELS),
+        ):
+            model = quantized_model(self.kwargs[key], models, models_dir)
+            if model != self.kwargs[key]:
+                logging.info(f"Using {model} instead of {self.kwargs[key]} on CPU")
+                self.kwargs[key] = model
+
+    def save_to_db(self, result: dict):
+        row = self.result_row(result)
+        if row is not None:
+            self.db.insert(*row)
+
+    def result_row(self, result: dict):
+
+        if "error" in result.keys():
+            return None
+
+        if result.get("duplicate"):
+            return self.duplicate_row(result)
+
+        rel_path = Path(result["path"]).relative_to(self.folder).as_posix()
+        size, mtime_ns, inode = result.get("signature", (None, None, None))
+
+        try:
+            classification, classification_confidence_avg = self.combine_classification(
+                result["classification"]
+            )
+        except KeyError:
+            classification = ""
+            classification_confidence_avg = 0
+        try:
+            object, object_confidence_avg = self.combine_object_detection(
+                result["object_detection"]
+            )
+        except KeyError:
+            object = ""
+            object_confidence_avg = 0
+        try:
+            OCR, ocr_confidence_avg = self.combine_ocr(result["OCR"])
+        except KeyError:
+            OCR = ""
+            ocr_confidence_avg = 0
+        if self.kwargs["OCR_model"] != "None":
+            self.ocr_checked += 1
+            if result.get("OCR_skipped"):
+                self.ocr_skipped += 1
+
+        return (
+            result["hash"],
+            rel_path,
+            classification,
+            classification_confidence_avg,
+            object,
+            object_confidence_avg,
+            OCR,
+            ocr_confidence_avg,
+            size,
+            mtime_ns,
+            inode,
+            result.get("hash_algorithm"),
+            self.fingerprint,
+        )
+
+    def duplicate_row(self, result: dict):
+        rel_path = Path(result["path"]).relative_to(self.folder).as_posix()
+        size, mtime_ns, inode = result.get("signature", (None, None, None))
+        stored = self.db.fetch_reusable(
+            result["hash"], result["hash_algorithm"], self.fingerprint
+        )
+        if stored is None:
+            logging.warning(f"No indexed duplicate found for {rel_path}")
+            return None
+        self.duplicates += 1
+        if result.get("inferred"):
+            self.inferred_duplicates += 1
+        return (
+            result["hash"],
+            rel_path,
+            *stored,
+            size,
+            mtime_ns,
+            inode,
+            result["hash_algorithm"],
+            self.fingerprint,
+        )
+
+    def read_folder(self, folder_path: Path):
+
+        if self.kwargs["FullUpdate"]:
+            # rebuild the FTS index once at the end instead of per row
+            self.db.begin_bulk_load()
+            self.bulk_load = True
+
+        self.kwargs["total_files"] = self.total_files
+        self.kwargs["finished_files"] = self.index
+
+        # copy the results of indexed duplicates instead of running the models,
+        # a full update only reuses results of this run
+        self.kwargs["hash_algorithm"] = resolve_algorithm(
+            self.kwargs.get("hash_algorithm")
+        )
+        if not self.kwargs["FullUpdate"]:
+            self.stored_hashes = self.db.fetch_reusable_hashes(
+                self.kwargs["hash_algorithm"], self.fingerprint
+            )
+        self.kwargs["hash_claims"] = HashClaims(self.stored_hashes)
+
+        if self.kwargs.get("index_backend", "threads") == "processes":
+            # one pool for the whole run so each process loads the models once
+            self.pool = process_pool(
+                self.kwargs.get("process_workers", 0), self.stored_hashes, self.runtime
+            )
+
+        # batches start while the folder is still being scanned
+        self.start_scan(folder_path)
+
+    def handle_events(self):
+        # until the scan and every batch are done
+        while self.scanning or self.batches:
+            event, *args = self.events.get()
+            if event == "found":
+                self.scan_found(*args)
+            elif event == "synced":
+                self.scan_synced(*args)
+            elif event == "scan_finished":
+                self.scan_finished()
+            elif event == "results":
+                self.read_folder_results(*args)
+            elif event == "progress":
+                self.on_progress(*args)
+            elif event == "read_finished":
+                self.batch_read_finished(*args)
+            elif event == "batch_finished":
+                self.batch_finished(*args)
+
+    def start_scan(self, folder_path: Path):
+        scan = FolderScan(
+            folder_path,
+            self.db.fetch_signatures(),
+            self.kwargs["FullUpdate"],
+            self.kwargs.get("scan_threads", SCAN_THREADS),
+            self.kwargs.get("scan_directories"),
+        )
+        self.scan_thread = threading.Thread(
+            target=self.run_scan, args=(scan,), name="scan", daemon=True
+        )
+        self.scanning = True
+        self.scan_thread.start()
+
+    def run_scan(self, scan: FolderScan):
+        synced = scan.run(lambda files: self.events.put(("found", files)))
+        self.events.put(("synced", *synced))
+        self.events.put(("scan_finished",))
+
+    def scan_found(self, files: list):
+        self.file_list.extend(files)
+        self.total_files = len(self.file_list)
+        self.kwargs["total_files"] = self.total_files
+        self.start_next_batch()
+
+    def scan_synced(self, unchanged_signatures: list, renames: list, deleted: list):
+        self.db.update_signatures(unchanged_signatures)
+        self.db.rename_paths(renames)
+        for path in deleted:
+            logging.debug(f"Removing {path} from database")
+        self.db.remove_many(deleted)
+        if deleted:
+            logging.info(f"Removed {len(deleted)} deleted files from database")
+
+    def scan_finished(self):
+        self.scan_thread.join()
+        self.scanning = False
+        logging.info(f"Indexing {self.total_files} files")
+        self.start_next_batch()
+
+    def read_folder_results(self, results: list):
+        self.indexed_files += len(results)
+        rows = []
+        for result in results:
+            if result.get("duplicate"):
+                # copied once the results of the first copy are stored
+                self.held_duplicates.setdefault(result["hash"], []).append(result)
+                continue
+            row = self.result_row(result)
+            if row is not None:
+                rows.append(row)
+        self.db.insert_many(rows)
+        self.stored_hashes.update(row[0] for row in rows)
+        self.insert_duplicates()
+
+    def insert_duplicates(self):
+        rows = []
+        for hash in [
+            hash for hash in self.held_duplicates if hash in self.stored_hashes
+        ]:
+            for result in self.held_duplicates.pop(hash):
+                row = self.duplicate_row(result)
+                if row is not None:
+                    rows.append(row)
+        self.db.insert_many(rows)
+
+    def start_next_batch(self):
+        # one batch reads at a time, up to prefetch_depth batches are indexed
+        if self.stopping:
+            return
+        if self.reading or len(self.batches) >= self.prefetch_depth:
+            return
+        available = self.total_files - self.index
+        # a partial batch only once the scan found every file
+        if available <= 0 or (self.scanning and available < self.batch_size):
+            return
+        self.kwargs["finished_files"] = self.index
+        batch = self.file_list[self.index : self.index + self.batch_size]
+        self.index += self.batch_size
+        self.start_batch(batch, **self.kwargs)
+
+    def start_batch(self, file_list: list, **kwargs):
+        callbacks = dict(
+            on_results=lambda results: self.events.put(("results", results)),
+            on_progress=lambda progress: self.events.put(("progress", progress)),
+            on_read_finished=lambda: self.events.put(("read_finished", batch)),
+        )
+        if self.pool is not None:
+            batch = ProcessBatchIndexer(file_list, self.pool, **callbacks, **kwargs)
+        else:
+            batch = BatchIndexer(file_list, **callbacks, **kwargs)
+        thread = threading.Thread(
+            target=self.run_batch, args=(batch,), name="batch", daemon=True
+        )
+        self.batches[batch] = thread
+        self.reading.add(batch)
+        thread.start()
+
+    def run_batch(self, batch):
+        try:
+            batch.run()
+        except Exception as e:
+            logging.error(e, exc_info=True)
+        self.events.put(("batch_finished", batch))
+
+    def batch_read_finished(self, batch):
+        self.reading.discard(batch)
+        self.start_next_batch()
+
+    def batch_finished(self, batch):
+        self.reading.discard(batch)
+        self.batches.pop(batch).join()
+        self.start_next_batch()
+
+    def full_finished(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        # the first copy of these could not be indexed
+        for results in self.held_duplicates.values():
+            for result in results:
+                logging.warning(f"No indexed duplicate found for {result['path']}")
+        self.held_duplicates.clear()
+        removed = self.db.remove_orphan_results()
+        if removed:
+            logging.info(f"Removed {removed} unused results from database")
+        if self.scheduler is not None:
+            logging.info(f"Inference threads: {self.scheduler.stats()}")
+        ocr_stats = ocr_engine_pool.stats()
+        if ocr_stats["engines"]:
+            logging.info(f"OCR engine pool: {ocr_stats}")
+        if self.bulk_load:
+            logging.info("Rebuilding search index")
+            self.db.end_bulk_load()
+            self.bulk_load = False
+        self.db.close()
+        self.db = None
+        logging.info(f"Model session cache: {session_cache.stats()}")
+        skipped = self.duplicates - self.inferred_duplicates
+        logging.info(
+            f"Copied results of {self.duplicates} duplicate images, "
+            f"saved {skipped * self.model_count()} model inference calls"
+        )
+        if ocr_gate_sensitivity(**self.kwargs) is not None:
+            logging.info(
+                f"Skipped OCR on {self.ocr_skipped} of {self.ocr_checked} images "
+                "without text"
+            )
+
+    def model_count(self):
+        return sum(
+            self.kwargs[model] != "None"
+            for model in ("classification_model", "object_detection_model", "OCR_model")
+        )
+
+    def combine_classification(self, classification_list):
+        if classification_list is None or classification_list == []:
+            classification = ""
+            classification_confidence_avg = 0
+        else:
+            classification = " ".join([res[0] for res in classification_list])
+            classification_confidence_list = [res[1] for res in classification_list]
+            classification_confidence_avg = sum(
+                classification_confidence_list  # type: ignore
+            ) / len(classification_confidence_list)
+        return classification, classification_confidence_avg
+
+    def combine_object_detection(self, object_detection_list):
+        if object_detection_list is None or object_detection_list == []:
+            object = ""
+            object_confidence_avg = 0
+        else:
+            obj_list = []
+            for res in object_detection_list:
+                if isinstance(res[0], list):
+                    obj_list.append(res[0][1])
+                else:
+                    obj_list.append(res[0])
+            object = " ".join(obj_list)
+            object_confidence_list = [res[1] for res in object_detection_list]
+            object_confidence_avg = sum(object_confidence_list) / len(  # type: ignore
+                object_confidence_list
+            )
+        return object, object_confidence_avg
+
+    def combine_ocr(self, ocr_list):
+        if ocr_list is None or ocr_list == []:
+            OCR = ""
+            ocr_confidence_avg = 0
+        else:
+            OCR = " ".join([res[0] for res in ocr_list])
+            ocr_confidence_list = [res[1] for res in ocr_list]
+            ocr_confidence_avg = sum(ocr_confidence_list) / len(ocr_confidence_list)
+        return OCR, ocr_confidence_avg
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+# suffix of the model name of an INT8 quantized variant
+QUANTIZED_SUFFIX = "-INT8"
+
+# model file of each model name, in the models directory
+CLASSIFICATION_MODELS = {
+    "YOLO11n": "yolo11n-cls.onnx",
+    "YOLO11s": "yolo11s-cls.onnx",
+    "YOLO11m": "yolo11m-cls.onnx",
+    "YOLO11l": "yolo11l-cls.onnx",
+    "YOLO11x": "yolo11x-cls.onnx",
+}
+DETECTION_MODELS = {
+    "YOLO11n": "yolo11n.onnx",
+    "YOLO11s": "yolo11s.onnx",
+    "YOLO11m": "yolo11m.onnx",
+    "YOLO11l": "yolo11l.onnx",
+    "YOLO11x": "yolo11x.onnx",
+}
+
+
+def quantized_file(file: str):
+    # yolo11n.onnx -> yolo11n.int8.onnx, made by dev/quantize_models.py
+    return file.removesuffix(".onnx") + ".int8.onnx"
+
+
+# the INT8 variants, listed when their files exist
+for models in (CLASSIFICATION_MODELS, DETECTION_MODELS):
+    models.update(
+        {
+            model + QUANTIZED_SUFFIX: quantized_file(file)
+            for model, file in list(models.items())
+        }
+    )
+
+
+def available_models(models: dict, models_dir: Path):
+    """
+    Returns the names of the models whose files are in models_dir.
+    """
+    return [model for model, file in models.items() if (models_dir / file).exists()]
+
+
+def quantized_model(model: str, models: dict, models_dir: Path):
+    """
+    Returns the name of the INT8 variant of the model when its file is in
+    models_dir, otherwise the model itself.
+    """
+    quantized = model + QUANTIZED_SUFFIX
+    if quantized in models and (models_dir / models[quantized]).exists():
+        return quantized
+    return model
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from rapidocr_paddle import RapidOCR
+
+    # rapidocr_paddle is installed with the gpu dependencies
+    OCR_USE_CUDA = True
+except ImportError:
+    from rapidocr_onnxruntime import RapidOCR
+
+    OCR_USE_CUDA = False
+
+
+class OCREnginePool:
+    """
+    Process-wide pool of RapidOCR engines.
+
+    Engines are created on first use, at most size of them, and reused by
+    every batch and thread of the process. A thread that finds no idle engine
+    waits for one once size engines exist.
+
+    Args:
+        size (int, optional): Maximum number of engines. Defaults to 1.
+        intra_op_num_threads (int, optional): onnxruntime threads of each engine,
+            0 lets onnxruntime decide. Defaults to 0.
+    """
+
+    def __init__(self, size: int = 1, intra_op_num_threads: int = 0):
+        self.size = max(1, size)
+        self.intra_op_num_threads = intra_op_num_threads
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.startup_time = 0.0
+        self.waits = 0
+
+    def configure(self, size: int = 1, intra_op_num_threads: int = 0):
+        """
+        Sets the pool size and engine threads. Idle engines made with other
+        threads are dropped, engines in use are dropped when released.
+        """
+        with self._lock:
+            self.size = max(1, size)
+            if intra_op_num_threads != self.intra_op_num_threads:
+                self.intra_op_num_threads = intra_op_num_threads
+                self._drop_idle()
+
+    def _drop_idle(self):
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._created -= 1
+
+    def create_engine(self):
+        start = time.perf_counter()
+        if OCR_USE_CUDA:
+            engine = RapidOCR(det_use_cuda=True, cls_use_cuda=True, rec_use_cuda=True)
+        elif self.intra_op_num_threads > 0:
+            engine = RapidOCR(
+                det_use_cuda=False,
+                cls_use_cuda=False,
+                rec_use_cuda=False,
+                intra_op_num_threads=self.intra_op_num_threads,
+            )
+        else:
+            engine = RapidOCR(
+                det_use_cuda=False, cls_use_cuda=False, rec_use_cuda=False
+            )
+        elapsed = time.perf_counter() - start
+        logging.info(f"Started RapidOCR engine in {elapsed:.3f}s")
+        with self._lock:
+            self.startup_time += elapsed
+        return engine
+
+    def acquire(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                self.waits += 1
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                # engines dropped by configure free their place in the pool
+                continue
+        try:
+            return self.create_engine()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def release(self, engine, intra_op_num_threads: int):
+        with self._lock:
+            # made before the pool was reconfigured, or beyond a reduced size
+            if (
+                intra_op_num_threads != self.intra_op_num_threads
+                or self._created > self.size
+            ):
+                self._created -= 1
+                return
+        self._idle.put(engine)
+
+    @contextmanager
+    def engine(self):
+        """
+        Borrows an engine for the duration of the with block.
+        """
+        intra_op_num_threads = self.intra_op_num_threads
+        engine = self.acquire()
+        try:
+            yield engine
+        finally:
+            self.release(engine, intra_op_num_threads)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "engines": self._created,
+                "startup_time": self.startup_time,
+                "waits": self.waits,
+            }
+
+
+ocr_engine_pool = OCREnginePool()
@@ -0,0 +1,696 @@
+# -*- coding: utf-8 -*-
+"""
+The indexing pipeline of a batch of images, without Qt.
+
+Stages and readers run on plain threads and report through callbacks. The
+batch runners collect the reports on one queue and handle them in the thread
+that called run, so the callbacks given to them are never called
+concurrently.
+"""
+
+import logging
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+
+from backend.hashing import resolve_algorithm
+from backend.image_process import (
+    INFERENCE_BATCH_SIZE,
+    MAX_IN_FLIGHT,
+    decode_image,
+    decode_min_size,
+    has_text,
+    models_dir,
+    ocr_gate_sensitivity,
+    read_file,
+    read_img,
+)
+from backend.model_registry import CLASSIFICATION_MODELS, DETECTION_MODELS
+from backend.ocr_pool import RapidOCR, ocr_engine_pool
+from backend.resources.label_list import coco, image_net
+from backend.scheduler import ThreadBudget
+from backend.yolo import YOLO11, YOLO11Cls
+
+# progress label of each model stage
+STAGE_LABELS = {
+    "classification": "Classification",
+    "object_detection": "Object detection",
+    "OCR": "OCR",
+}
+
+
+def ignore(*args):
+    pass
+
+
+class ClassificationStage:
+    name = "classification"
+
+    def __init__(
+        self, classification_model: str, classification_threshold: float, **kwargs
+    ):
+        self.model = classification_model
+        self.threshold = classification_threshold
+        self.kwargs = kwargs
+        self.local = threading.local()
+
+    def run(self, image_queue: queue.Queue, emit):
+        """
+        Classifies the images of image_queue until the end of the stream.
+
+        Args:
+            image_queue (queue.Queue): Queue of (index, image) items.
+            emit (callable): Called with each [(index, result)] list.
+        """
+        chunk_size = self.kwargs.get("inference_batch_size", INFERENCE_BATCH_SIZE)
+
+        def classify_chunk(chunk: list):
+            indices = [i for i, _ in chunk]
+            images = [img for _, img in chunk]
+            # drop the references so the images are freed once all stages are done
+            del chunk[:]
+            try:
+                results = self.classify_batch(self.classifier(), images)
+            except Exception as e:
+                logging.error(f"Classification failed. Error:{e}", exc_info=True)
+                results = [[] for _ in images]
+            return list(zip(indices, results))
+
+        self.kwargs["scheduler"].run_stage(
+            self.name, image_queue, chunk_size, classify_chunk, emit
+        )
+
+    def classifier(self):
+        """
+        Returns the model of the calling thread. The chunks run on several
+        threads at once and YOLO11Cls keeps its input buffers between calls,
+        the sessions are shared by session_cache.
+        """
+        if not hasattr(self.local, "yolo_cls"):
+            yolo_cls = None
+            if self.model in CLASSIFICATION_MODELS:
+                YOLO11_path = models_dir / CLASSIFICATION_MODELS[self.model]
+                yolo_cls = YOLO11Cls(YOLO11_path, conf_thres=self.threshold)
+            self.local.yolo_cls = yolo_cls
+        return self.local.yolo_cls
+
+    def classify_batch(self, yolo_cls: YOLO11Cls | None, images: list[np.ndarray]):
+        results = [[] for _ in images]
+        if yolo_cls is None:
+            return results
+
+        valid = [i for i, image in enumerate(images) if image is not None]
+        predictions = yolo_cls.predict_batch([images[i] for i in valid])
+        for i, (class_ids, confidence) in zip(valid, predictions):
+            if len(class_ids) == 0:
+                continue
+            class_names = [image_net[class_id][1] for class_id in class_ids]
+            results[i] = [
+                (class_name, confidence[class_names.index(class_name)])
+                for class_name in class_names
+            ]
+
+        return results
+
+
+class ObjectDetectionStage:
+    name = "object_detection"
+
+    def __init__(
+        self,
+        object_detection_model: str,
+        object_detection_dataset: list[str],
+        object_detection_conf_threshold: float,
+        object_detection_iou_threshold: float,
+        **kwargs,
+    ):
+        self.model = object_detection_model
+        self.dataset = object_detection_dataset
+        self.conf_threshold = object_detection_conf_threshold
+        self.iou_threshold = object_detection_iou_threshold
+        self.kwargs = kwargs
+        self.local = threading.local()
+
+    def run(self, image_queue: queue.Queue, emit):
+        """
+        Detects objects in the images of image_queue until the end of the
+        stream, see ClassificationStage.run.
+        """
+        chunk_size = self.kwargs.get("inference_batch_size", INFERENCE_BATCH_SIZE)
+
+        def detect_chunk(chunk: list):
+            indices = [i for i, _ in chunk]
+            images = [img for _, img in chunk]
+            # drop the references so the images are freed once all stages are done
+            del chunk[:]
+            try:
+                results = self.object_detection_batch(*self.detectors(), images)
+            except Exception as e:
+                logging.error(f"Object detection failed. Error:{e}", exc_info=True)
+                results = [[] for _ in images]
+            return list(zip(indices, results))
+
+        self.kwargs["scheduler"].run_stage(
+            self.name, image_queue, chunk_size, detect_chunk, emit
+        )
+
+    def detectors(self):
+        """
+        Returns the models of the calling thread and their class names, see
+        ClassificationStage.classifier. YOLO11 also keeps the size of the
+        image whose boxes it scales.
+        """
+        if not hasattr(self.local, "yolo_list"):
+            yolo_list = []
+            class_name_list_list = []
+            datasets = {
+                "COCO": coco,
+            }
+            if self.model in DETECTION_MODELS:
+                for dataset_name in self.dataset:
+                    if dataset_name == "COCO":
+                        YOLO11_path = models_dir / DETECTION_MODELS[self.model]
+                        yolo_list.append(
+                            YOLO11(YOLO11_path, self.conf_threshold, self.iou_threshold)
+                        )
+                        class_name_list_list.append(datasets[dataset_name])
+            self.local.yolo_list = yolo_list
+            self.local.class_name_list_list = class_name_list_list
+        return self.local.yolo_list, self.local.class_name_list_list
+
+    def object_detection_batch(
+        self,
+        yolo_list: list[YOLO11],
+        class_name_list_list: list[list[str]],
+        images: list[np.ndarray],
+    ):
+        results = [[] for _ in images]
+        valid = [i for i, image in enumerate(images) if image is not None]
+        for yolo, class_name_list in zip(yolo_list, class_name_list_list):
+            detections = yolo.detect_batch([images[i] for i in valid])
+            for i, (_, scores, class_ids) in zip(valid, detections):
+                if len(class_ids) == 0:
+                    continue
+                class_names = [class_name_list[class_id] for class_id in class_ids]
+                results[i].extend(
+                    [
+                        (class_name, scores[class_names.index(class_name)])
+                        for class_name in class_names
+                    ]
+                )
+        return results
+
+
+class OCRStage:
+    name = "OCR"
+
+    def __init__(self, OCR_model: str, **kwargs):
+        self.model = OCR_model
+        self.gate_sensitivity = ocr_gate_sensitivity(**kwargs)
+        self.kwargs = kwargs
+
+    def run(self, image_queue: queue.Queue, emit):
+        """
+        Reads the text of the images of image_queue until the end of the
+        stream, see ClassificationStage.run. The result of an image skipped by
+        the text gate is None.
+        """
+
+        def OCR_chunk(chunk: list):
+            # RapidOCR runs one image at a time, each borrowing an engine of the pool
+            i, image = chunk.pop()
+            return [self.OCR_task(self.model, image, i)]
+
+        self.kwargs["scheduler"].run_stage(
+            self.name,
+            image_queue,
+            1,
+            OCR_chunk,
+            emit,
+            self.kwargs.get("ocr_concurrency", 1),
+        )
+
+    def OCR_task(self, model: str, image: np.ndarray, i: int):
+        if model != "RapidOCR" or image is None:
+            return i, []
+        with ocr_engine_pool.engine() as engine:
+            if self.gate_sensitivity is not None and not self.text_found(
+                engine, image, i
+            ):
+                return i, None
+            return i, self.OCR_image(engine, image, i)
+
+    def text_found(self, engine: RapidOCR, image: np.ndarray, i: int):
+        try:
+            return has_text(engine, image, self.gate_sensitivity)
+        except Exception as e:
+            # run the full OCR when the gate fails
+            logging.error(
+                f"Image Index:{i}, text gate failed. Error:{e}", exc_info=True
+            )
+            return True
+
+    def OCR_image(self, engine: RapidOCR | None, image: np.ndarray, i: int):
+        if engine is None or image is None:
+            return []
+        try:
+            result, elapse = engine(image, use_det=True, use_cls=True, use_rec=True)
+        except Exception as e:
+            path_list = self.kwargs.get("path_list", [])
+            if len(path_list) > i:
+                logging.error(
+                    f"Image: {path_list[i]}, OCR failed. Error:{e}",
+                    exc_info=True,
+                )
+            else:
+                logging.error(f"Image Index:{i}, OCR failed. Error:{e}", exc_info=True)
+            return []
+        if result is None or len(result) == 0:
+            return []
+        return [(res[1], res[2]) for res in result]
+
+
+class HashClaims:
+    """
+    The content hashes of an index run, shared by its batches and checked
+    before an image is queued or submitted. The first image of a hash runs the
+    models, later copies are duplicates whose results are copied from it,
+    once it is saved when it is still in the models. Thread safe.
+
+    Args:
+        indexed (set, optional): Hashes whose results are already stored.
+    """
+
+    def __init__(self, indexed: set | None = None):
+        self.hashes = set(indexed or ())
+        self.lock = threading.Lock()
+
+    def claim(self, hash: str):
+        """
+        Returns True for the first image of hash, False for its duplicates.
+        """
+        with self.lock:
+            if hash in self.hashes:
+                return False
+            self.hashes.add(hash)
+            return True
+
+
+class HashReader:
+    """
+    Reads, hashes and decodes files, and puts the images on the queues of the
+    model stages. Waits for a slot before each file, so at most as many images
+    as slots are in the pipeline.
+    """
+
+    def __init__(
+        self,
+        file_paths: list[Path],
+        image_queues: list[queue.Queue],
+        slots: threading.Semaphore,
+        min_size: tuple | None = None,
+        hash_algorithm: str | None = None,
+        hash_claims: HashClaims | None = None,
+    ):
+        self.file_paths = file_paths
+        self.image_queues = image_queues
+        self.slots = slots
+        self.min_size = min_size
+        self.hash_algorithm = hash_algorithm
+        self.hash_claims = hash_claims or HashClaims()
+
+    def run(self, on_hash, on_error):
+        """
+        Args:
+            on_hash (callable): Called with (index, hash, signature, duplicate)
+                of each file read.
+            on_error (callable): Called with (index, error) of each file that
+                could not be read.
+        """
+        try:
+            for i, file_path in enumerate(self.file_paths):
+                # wait until there is room in the pipeline
+                self.slots.acquire()
+                try:
+                    file_bytes, hash, signature = read_file(
+                        file_path, self.hash_algorithm
+                    )
+                    if not self.hash_claims.claim(hash):
+                        # skip decoding and inference of duplicates
+                        on_hash(i, hash, signature, True)
+                        continue
+                    img = decode_image(file_bytes, file_path, self.min_size)
+                    del file_bytes
+                except Exception as e:
+                    logging.error(e, exc_info=True)
+                    on_error(i, str(e))
+                    continue
+                on_hash(i, hash, signature, False)
+                for image_queue in self.image_queues:
+                    image_queue.put((i, img))
+                del img
+        except Exception as e:
+            logging.error(e, exc_info=True)
+        finally:
+            # end of stream for the model stages
+            for image_queue in self.image_queues:
+                image_queue.put(None)
+
+
+class BatchIndexer:
+    """
+    Streams a batch of images through hashing/decoding and the model stages.
+
+    Every decoded image is put on a queue per enabled model stage and is
+    released once the last of them is done with it. At most max_in_flight
+    images are held at a time, so memory does not grow with the batch size.
+
+    Args:
+        image_list (list[Path]): The images of the batch.
+        on_results (callable, optional): Called with each list of result dicts.
+        on_progress (callable, optional): Called with progress messages.
+        on_read_finished (callable, optional): Called once every image has
+            been read, the next batch can start reading.
+        **kwargs: The index settings.
+    """
+
+    def __init__(
+        self,
+        image_list: list[Path],
+        on_results=ignore,
+        on_progress=ignore,
+        on_read_finished=ignore,
+        **kwargs,
+    ):
+        self.image_list = image_list
+        self.on_results = on_results
+        self.on_progress = on_progress
+        self.on_read_finished = on_read_finished
+        self.kwargs = kwargs
+        self.progress_dict = {}
+        self.result_list = []
+        self.pending = {}
+        self.kwargs["path_list"] = image_list
+
+        self.max_in_flight = max(1, int(kwargs.get("max_in_flight", MAX_IN_FLIGHT)))
+        self.slots = threading.Semaphore(self.max_in_flight)
+        # chunks larger than half of the images in flight could only run
+        # partial, a chunk fills up while the previous one is in the model
+        self.kwargs["inference_batch_size"] = max(
+            1,
+            min(
+                kwargs.get("inference_batch_size", INFERENCE_BATCH_SIZE),
+                self.max_in_flight // 2,
+            ),
+        )
+        # the inference threads shared by the model stages, for the whole run
+        # when given by Indexer
+        if self.kwargs.get("scheduler") is None:
+            self.kwargs["scheduler"] = ThreadBudget(
+                kwargs.get("thread_budget", 0), kwargs.get("intra_op_num_threads", 0)
+            )
+        # images read by OCR hold their slots as well
+        ocr_concurrency = (
+            kwargs.get("ocr_concurrency", 0) or self.kwargs["scheduler"].slots
+        )
+        self.kwargs["ocr_concurrency"] = max(
+            1, min(ocr_concurrency, self.max_in_flight // 2)
+        )
+
+        self.stages = []
+        if self.kwargs["classification_model"] != "None":
+            self.stages.append(ClassificationStage(**self.kwargs))
+        if self.kwargs["object_detection_model"] != "None":
+            self.stages.append(ObjectDetectionStage(**self.kwargs))
+        if self.kwargs["OCR_model"] != "None":
+            self.stages.append(OCRStage(**self.kwargs))
+        self.stage_names = [stage.name for stage in self.stages]
+        self.queues = {stage.name: queue.Queue() for stage in self.stages}
+        # images each stage has finished, for the progress
+        self.finished_files = dict.fromkeys(
+            self.stage_names, self.kwargs.get("finished_files", 0)
+        )
+
+        self.hash_algorithm = resolve_algorithm(kwargs.get("hash_algorithm"))
+        self.min_size = None
+        if kwargs.get("reduced_decode", True):
+            self.min_size = decode_min_size(
+                self.kwargs["classification_model"],
+                self.kwargs["object_detection_model"],
+                self.kwargs["OCR_model"],
+            )
+
+    def run(self):
+        """
+        Indexes the batch, returns once every image is done.
+        """
+        events = queue.Queue()
+        # start the model stages first, they wait for images on their queues
+        threads = [
+            threading.Thread(
+                target=self.run_stage,
+                args=(stage, events),
+                name=stage.name,
+                daemon=True,
+            )
+            for stage in self.stages
+        ]
+        reader = HashReader(
+            self.image_list,
+            list(self.queues.values()),
+            self.slots,
+            self.min_size,
+            self.hash_algorithm,
+            self.kwargs.get("hash_claims"),
+        )
+        threads.append(
+            threading.Thread(
+                target=self.run_reader, args=(reader, events), name="read", daemon=True
+            )
+        )
+        for thread in threads:
+            thread.start()
+
+        running = len(threads)
+        while running:
+            event, *args = events.get()
+            if event == "finished":
+                running -= 1
+                if args[0] == "read":
+                    self.on_read_finished()
+            elif event == "hash":
+                self.hash_result(*args)
+            elif event == "error":
+                self.read_error(*args)
+            elif event == "result":
+                self.stage_result(*args)
+        for thread in threads:
+            thread.join()
+        self.result_emit()
+
+    def run_stage(self, stage, events: queue.Queue):
+        try:
+            stage.run(
+                self.queues[stage.name],
+                lambda result: events.put(("result", stage.name, result)),
+            )
+        except Exception as e:
+            logging.error(e, exc_info=True)
+        logging.debug(f"{STAGE_LABELS[stage.name]} finished")
+        events.put(("finished", stage.name))
+
+    def run_reader(self, reader: HashReader, events: queue.Queue):
+        reader.run(
+            lambda *args: events.put(("hash", *args)),
+            lambda *args: events.put(("error", *args)),
+        )
+        events.put(("finished", "read"))
+
+    def pending_result(self, i: int):
+        if i not in self.pending:
+            result_dict = {}
+            result_dict["path"] = self.image_list[i]
+            result_dict["hash_algorithm"] = self.hash_algorithm
+            result_dict["classification"] = []
+            result_dict["object_detection"] = []
+            result_dict["OCR"] = []
+            self.pending[i] = (result_dict, set(self.stage_names))
+        return self.pending[i]
+
+    def check_result_finished(self, i: int):
+        result_dict, remaining = self.pending[i]
+        if remaining or ("hash" not in result_dict and "error" not in result_dict):
+            return
+        del self.pending[i]
+        self.result_list.append(result_dict)
+        # the image has left the pipeline, let the reader decode the next one
+        self.slots.release()
+        if len(self.result_list) >= self.max_in_flight:
+            self.on_results(self.result_list)
+            self.result_list = []
+
+    def hash_result(self, i: int, hash: str, signature: tuple, duplicate: bool):
+        result_dict, remaining = self.pending_result(i)
+        result_dict["hash"] = hash
+        result_dict["signature"] = signature
+        if duplicate:
+            # results are copied from the indexed duplicate, never queued
+            result_dict["duplicate"] = True
+            remaining.clear()
+        self.check_result_finished(i)
+
+    def read_error(self, i: int, error: str):
+        result_dict, remaining = self.pending_result(i)
+        result_dict["error"] = error
+        # the image was never queued
+        remaining.clear()
+        self.check_result_finished(i)
+
+    def stage_result(self, stage: str, result: list):
+        self.progress(stage, len(result))
+        for i, res in result:
+            result_dict, remaining = self.pending_result(i)
+            if res is None:
+                # skipped by the OCR text gate
+                result_dict["OCR_skipped"] = True
+                res = []
+            result_dict[stage] = res
+            remaining.discard(stage)
+            self.check_result_finished(i)
+
+    def result_emit(self):
+        # images a model stage failed to return are saved with what we have
+        for i in sorted(self.pending.keys()):
+            result_dict, remaining = self.pending.pop(i)
+            if "hash" not in result_dict and "error" not in result_dict:
+                continue
+            for stage in remaining:
+                logging.error(
+                    f"{stage} failed for image:{self.image_list[i].as_posix()}"
+                )
+            self.result_list.append(result_dict)
+
+        self.on_results(self.result_list)
+        self.result_list = []
+
+    def progress(self, stage: str, count: int):
+        self.finished_files[stage] += count
+        total_images = self.kwargs.get("total_files", 0)
+        label = STAGE_LABELS[stage]
+        self.progress_dict[stage] = (
+            f"{label} progress: {self.finished_files[stage]}/{total_images}"
+        )
+        progress_str = ", ".join(self.progress_dict.values())
+        logging.debug(f"Progress: {progress_str}")
+        self.on_progress(progress_str)
+
+
+class ProcessBatchIndexer:
+    """
+    Indexes a batch of images with read_img on a process pool.
+
+    At most max_in_flight images are submitted at a time and finished results
+    are reported in groups while the batch is still running. The callbacks
+    are the same as those of BatchIndexer.
+
+    The processes hash the files and skip the inference of hashes stored
+    before the run. The hashes are claimed here when their results return,
+    a later copy of a hash is reported as a duplicate and its results are
+    discarded for those of the first copy.
+    """
+
+    def __init__(
+        self,
+        image_list: list[Path],
+        pool: ProcessPoolExecutor,
+        on_results=ignore,
+        on_progress=ignore,
+        on_read_finished=ignore,
+        **kwargs,
+    ):
+        self.image_list = image_list
+        self.pool = pool
+        self.on_results = on_results
+        self.on_progress = on_progress
+        self.on_read_finished = on_read_finished
+        self.kwargs = kwargs
+        self.max_in_flight = max(1, int(kwargs.get("max_in_flight", MAX_IN_FLIGHT)))
+        self.hash_claims = kwargs.get("hash_claims")
+
+        # only the model settings are sent to the processes
+        self.read_img_kwargs = {
+            key: kwargs[key]
+            for key in (
+                "classification_model",
+                "classification_threshold",
+                "object_detection_model",
+                "object_detection_dataset",
+                "object_detection_conf_threshold",
+                "object_detection_iou_threshold",
+                "OCR_model",
+                "reduced_decode",
+                "hash_algorithm",
+                "ocr_gate",
+                "ocr_gate_sensitivity",
+            )
+            if key in kwargs
+        }
+
+    def run(self):
+        """
+        Indexes the batch, returns once every image is done.
+        """
+        total_images = self.kwargs.get("total_files", 0)
+        finished_files = self.kwargs.get("finished_files", 0)
+
+        paths = iter(self.image_list)
+        running = set()
+        result_list = []
+        submitted = False
+        while True:
+            for path in paths:
+                running.add(self.pool.submit(read_img, path, **self.read_img_kwargs))
+                if len(running) >= self.max_in_flight:
+                    break
+            else:
+                if not submitted:
+                    submitted = True
+                    self.on_read_finished()
+            if not running:
+                break
+
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result_list.append(self.claim(future.result()))
+                except Exception as e:
+                    logging.error(e, exc_info=True)
+                    result_list.append({"error": str(e)})
+            finished_files += len(done)
+            self.on_progress(f"Indexing progress: {finished_files}/{total_images}")
+
+            if len(result_list) >= self.max_in_flight:
+                self.on_results(result_list)
+                result_list = []
+
+        self.on_results(result_list)
+
+    def claim(self, result: dict):
+        """
+        Returns result, or a duplicate result when another image of its hash
+        was claimed first.
+        """
+        if self.hash_claims is None or "hash" not in result:
+            return result
+        if result.get("duplicate") or self.hash_claims.claim(result["hash"]):
+            return result
+        duplicate = {
+            key: result[key] for key in ("hash", "hash_algorithm", "path", "signature")
+        }
+        # its inference ran, only the stats tell it apart
+        duplicate["duplicate"] = True
+        duplicate["inferred"] = True
+        return duplicate
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+# image formats cv2 can decode
+SUPPORTED_SUFFIXES = frozenset(
+    {
+        ".bmp",
+        ".dib",
+        ".jpeg",
+        ".jpg",
+        ".jpe",
+        ".jp2",
+        ".png",
+        ".webp",
+        ".avif",
+        ".pbm",
+        ".pgm",
+        ".ppm",
+        ".pxm",
+        ".pnm",
+        ".pfm",
+        ".sr",
+        ".ras",
+        ".tiff",
+        ".tif",
+        ".exr",
+        ".hdr",
+        ".pic",
+    }
+)
+# directories listed at once, listing is mostly waiting on the file system
+SCAN_THREADS = 8
+
+
+def entry_signature(entry: os.DirEntry):
+    """
+    (size, mtime_ns, inode) of a directory entry, the same as file_signature
+    of its stat. DirEntry.stat leaves st_ino at 0 on Windows, inode() doesn't.
+    """
+    stat = entry.stat()
+    return (stat.st_size, stat.st_mtime_ns, entry.inode() or None)
+
+
+def scan_directory(path: str, with_files: bool = True):
+    """
+    Lists one directory.
+
+    Args:
+        path (str): The directory.
+        with_files (bool, optional): Whether to list the files or only the
+            subdirectories. Defaults to True.
+
+    Returns:
+        tuple: The (path, signature) of the supported files, the paths of the
+            subdirectories and the paths of the entries that could not be
+            read. Symlinked directories are not followed.
+    """
+    files = []
+    subdirs = []
+    skipped = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif (
+                    with_files
+                    and os.path.splitext(entry.name)[1].lower() in SUPPORTED_SUFFIXES
+                    and entry.is_file()
+                ):
+                    files.append((Path(entry.path), entry_signature(entry)))
+            except OSError as e:
+                logging.warning(f"Skipping {entry.path}. Error:{e}")
+                skipped.append(entry.path)
+    return files, subdirs, skipped
+
+
+def walk(
+    directories: list,
+    threads: int = SCAN_THREADS,
+    failed: list | None = None,
+    recursive: bool = True,
+    with_files: bool = True,
+):
+    """
+    Lists directories with os.scandir on a thread pool, and their
+    subdirectories when recursive.
+
+    Yields each directory as soon as it is listed, while the others are still
+    being listed. A directory that no longer exists is listed as empty.
+
+    Args:
+        directories (list): The directories to list.
+        threads (int, optional): Directories listed at once.
+        failed (list, optional): Collects the paths of the directories and
+            entries that could not be read, whose files may be missing.
+        recursive (bool, optional): Whether to list the subdirectories.
+        with_files (bool, optional): Whether to list the files.
+
+    Yields:
+        tuple: The directory, the (path, signature) of its supported files and
+            its subdirectories.
+    """
+    with ThreadPoolExecutor(max(1, threads), thread_name_prefix="scan") as executor:
+        pending = {}
+        for directory in directories:
+            directory = os.fspath(directory)
+            pending[executor.submit(scan_directory, directory, with_files)] = directory
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    files, subdirs, skipped = future.result()
+                except FileNotFoundError:
+                    # removed since it was found or changed
+                    files, subdirs, skipped = [], [], []
+                except OSError as e:
+                    logging.error(f"Can't list {path}. Error:{e}")
+                    files, subdirs, skipped = [], [], [path]
+                if failed is not None:
+                    failed.extend(skipped)
+                if recursive:
+                    for subdir in subdirs:
+                        future = executor.submit(scan_directory, subdir, with_files)
+                        pending[future] = subdir
+                yield path, files, subdirs
+
+
+def scan_files(
+    folder: Path,
+    threads: int = SCAN_THREADS,
+    failed: list | None = None,
+    directories: list | None = None,
+):
+    """
+    Walks folder for the supported files, see walk.
+
+    Args:
+        folder (Path): The folder to walk.
+        threads (int, optional): Directories listed at once.
+        failed (list, optional): Collects the paths that could not be read.
+        directories (list, optional): Only list these directories of folder,
+            without their subdirectories.
+
+    Yields:
+        list: (path, signature) of the supported files of a directory.
+    """
+    if directories is None:
+        listing = walk([folder], threads, failed)
+    else:
+        listing = walk(directories, threads, failed, recursive=False)
+    for _, files, _ in listing:
+        if files:
+            yield files
+
+
+def list_directories(folder: Path, threads: int = SCAN_THREADS):
+    """
+    Returns the paths of folder and of all its subdirectories.
+    """
+    return [path for path, _, _ in walk([folder], threads, with_files=False)]
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+# seconds a stage waits for more images before running a partial chunk
+CHUNK_WAIT = 0.05
+
+
+class ThreadBudget:
+    """
+    Shares a budget of inference threads between the model stages of the
+    threads backend.
+
+    Every inference call holds threads_per_call threads of the budget while it
+    runs, so the stages together never run more threads than the budget. The
+    threads are not split up front: a stage that runs out of images stops
+    asking for them and the stages still running take them over, up to the
+    last stage of a batch running alone on the whole budget.
+
+    Args:
+        threads (int, optional): The budget, 0 for the number of cores.
+        threads_per_call (int, optional): onnxruntime intra-op threads of each
+            call, 0 for 1. Defaults to 1.
+    """
+
+    def __init__(self, threads: int = 0, threads_per_call: int = 1):
+        self.threads = threads if threads > 0 else os.cpu_count() or 1
+        self.threads_per_call = max(1, min(threads_per_call, self.threads))
+        # number of calls running at once
+        self.slots = self.threads // self.threads_per_call
+        self._semaphore = threading.Semaphore(self.slots)
+        self._lock = threading.Lock()
+        self.busy_time = {}
+        self.start_time = time.perf_counter()
+
+    @contextmanager
+    def call(self, stage: str):
+        """
+        Holds threads of the budget for the duration of the with block.
+        """
+        self._semaphore.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._semaphore.release()
+            with self._lock:
+                self.busy_time[stage] = self.busy_time.get(stage, 0.0) + elapsed
+
+    def run_stage(
+        self,
+        stage: str,
+        image_queue: queue.Queue,
+        chunk_size: int,
+        task,
+        emit,
+        concurrency: int = 0,
+    ):
+        """
+        Runs task on chunks of a stage queue, as many at once as the budget
+        allows, until the end of the stream. A partial chunk runs when no more
+        images come for CHUNK_WAIT seconds.
+
+        Args:
+            stage (str): Stage name, for the stats.
+            image_queue (queue.Queue): Queue of (index, image) items.
+            chunk_size (int): Number of items per task.
+            task (callable): Takes a chunk, returns its [(index, result)] list.
+                Runs on several threads at once, models with state between
+                calls need one instance per thread.
+            emit (callable): Called with the result list of each task, in the
+                calling thread.
+            concurrency (int, optional): Cap on the tasks run at once, 0 for
+                the budget slots.
+        """
+        concurrency = min(concurrency or self.slots, self.slots)
+
+        def run(chunk):
+            with self.call(stage):
+                return task(chunk)
+
+        pending = set()
+        chunk = []
+        done = False
+        with ThreadPoolExecutor(concurrency, thread_name_prefix=stage) as executor:
+            while not done or chunk or pending:
+                if pending:
+                    # only wait for a result when no more chunks can be started
+                    blocked = len(pending) >= concurrency or (done and not chunk)
+                    finished, pending = wait(
+                        pending,
+                        timeout=None if blocked else 0,
+                        return_when=FIRST_COMPLETED,
+                    )
+                    for future in finished:
+                        emit(future.result())
+                    if len(pending) >= concurrency:
+                        continue
+                stalled = False
+                if not done and len(chunk) < chunk_size:
+                    # never block while images are held: the reader may be
+                    # waiting for them to leave the pipeline
+                    try:
+                        item = image_queue.get(
+                            timeout=CHUNK_WAIT if pending or chunk else None
+                        )
+                    except queue.Empty:
+                        stalled = True
+                    else:
+                        if item is None:
+                            done = True
+                        else:
+                            chunk.append(item)
+                        del item
+                if chunk and (len(chunk) >= chunk_size or done or stalled):
+                    pending.add(executor.submit(run, chunk))
+                    chunk = []
+
+    def stats(self) -> dict:
+        """
+        Returns the busy seconds of each stage and the share of the budget used
+        since the budget was created.
+        """
+        elapsed = time.perf_counter() - self.start_time
+        with self._lock:
+            busy_time = dict(self.busy_time)
+        utilization = 0.0
+        if elapsed > 0:
+            utilization = sum(busy_time.values()) / (elapsed * self.slots)
+        return {
+            "threads": self.threads,
+            "threads_per_call": self.threads_per_call,
+            "busy_time": {stage: round(t, 3) for stage, t in busy_time.items()},
+            "utilization": round(utilization, 3),
+        }
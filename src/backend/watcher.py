@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import time
+from pathlib import Path
+
+from PySide6.QtCore import QFileSystemWatcher, QObject, QTimer, Signal
+
+from backend.scanner import SCAN_THREADS, scan_directory, walk
+
+# quiet time after the last change before the changes are indexed
+DEBOUNCE_MS = 2000
+# files modified more recently than this may still be written
+SETTLE_NS = 2_000_000_000
+# seconds between scans when notifications are not used
+POLL_INTERVAL = 60
+
+
+class FolderWatcher(QObject):
+    """
+    Watches a folder for added, changed, moved and deleted pictures.
+
+    Every directory of the folder is watched with QFileSystemWatcher, which
+    uses inotify on Linux and the native notifications on Windows and macOS.
+    Changes mark their directory dirty, and once no change came for the
+    debounce time the dirty directories whose pictures or subdirectories
+    changed are emitted with changed, for IndexWorker to scan. Other changes,
+    like the database written by the index, are ignored. A directory with
+    files still being written stays dirty until they settle.
+
+    Directory notifications only report added, removed and renamed entries,
+    not pictures written in place. Every poll interval the watched directories
+    are listed again and those whose file signatures changed are marked dirty.
+
+    Without notifications, on network shares whose changes are not notified
+    or when the system watch limit is reached, rescan is emitted every poll
+    interval instead. The scan of the whole folder compares stat signatures
+    and only hashes the files whose signature changed.
+
+    Args:
+        folder_path (Path): The folder to watch.
+        polling (bool, optional): Poll instead of watching. Defaults to False.
+        poll_interval (int, optional): Seconds between scans when polling,
+            and between checks for pictures written in place when watching.
+        debounce_ms (int, optional): Quiet time before changes are emitted.
+    """
+
+    changed = Signal(list)
+    rescan = Signal()
+
+    def __init__(
+        self,
+        folder_path: Path,
+        polling: bool = False,
+        poll_interval: int = POLL_INTERVAL,
+        debounce_ms: int = DEBOUNCE_MS,
+        threads: int = SCAN_THREADS,
+    ):
+        super(FolderWatcher, self).__init__()
+        self.folder = folder_path
+        self.polling = polling
+        self.poll_interval = max(1, poll_interval)
+        self.debounce_ms = debounce_ms
+        self.threads = threads
+        self.dirty = set()
+        # directory -> listing when last emitted or when watching started
+        self.listings = {}
+        self.watcher = None
+        self.check_timer = None
+
+    def run(self):
+        try:
+            # created here to live in the thread of the watcher
+            self.debounce_timer = QTimer(self)
+            self.debounce_timer.setSingleShot(True)
+            self.debounce_timer.timeout.connect(self.flush)
+            if self.polling:
+                self.start_polling()
+            else:
+                self.start_watching()
+        except Exception as e:
+            logging.error(e, exc_info=True)
+
+    def start_watching(self):
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.directory_changed)
+        directories = self.list_directories(self.folder)
+        if self.watch(directories):
+            logging.info(f"Watching {len(directories)} directories of {self.folder}")
+            self.check_timer = QTimer(self)
+            self.check_timer.timeout.connect(self.check_modified)
+            self.check_timer.start(self.poll_interval * 1000)
+
+    def watch(self, directories: list):
+        failed = self.watcher.addPaths(directories)
+        if not failed:
+            return True
+        logging.warning(
+            f"Can't watch {len(failed)} directories, polling {self.folder} "
+            f"every {self.poll_interval}s instead"
+        )
+        self.stop_watching()
+        self.start_polling()
+        return False
+
+    def list_directories(self, folder):
+        """
+        Returns the paths of folder and of its subdirectories, and keeps their
+        listings to compare the changes with.
+        """
+        directories = []
+        for path, files, subdirs in walk([folder], self.threads):
+            self.listings[path] = self.listing(files, subdirs)
+            directories.append(path)
+        return directories
+
+    def listing(self, files: list, subdirs: list):
+        return frozenset(files), frozenset(subdirs)
+
+    def forget(self, directory: str):
+        """
+        Stops watching a directory that is gone and its subdirectories, whose
+        watches would keep reporting paths that no longer exist.
+
+        Returns:
+            list: The forgotten directories, for their pictures to be removed
+                from the database.
+        """
+        prefix = os.path.join(directory, "")
+        directories = [
+            path
+            for path in self.listings
+            if path == directory or path.startswith(prefix)
+        ]
+        for path in directories:
+            del self.listings[path]
+            self.dirty.discard(path)
+        if directories:
+            self.watcher.removePaths(directories)
+        return directories
+
+    def check_modified(self):
+        """
+        Lists the watched directories again, for the pictures written in place
+        that their notifications don't report.
+        """
+        if self.watcher is None:
+            return
+        for path, files, subdirs in walk(
+            list(self.listings), self.threads, recursive=False
+        ):
+            if self.listings.get(path) != self.listing(files, subdirs):
+                self.dirty.add(path)
+        if self.dirty:
+            self.flush()
+
+    def stop_watching(self):
+        if self.check_timer is not None:
+            self.check_timer.stop()
+            self.check_timer = None
+        if self.watcher is not None:
+            self.watcher.directoryChanged.disconnect(self.directory_changed)
+            self.watcher.deleteLater()
+            self.watcher = None
+        self.debounce_timer.stop()
+        self.dirty.clear()
+        self.listings.clear()
+
+    def start_polling(self):
+        self.polling = True
+        self.poll_timer = QTimer(self)
+        self.poll_timer.timeout.connect(self.rescan)
+        self.poll_timer.start(self.poll_interval * 1000)
+        logging.info(f"Polling {self.folder} every {self.poll_interval}s")
+
+    def directory_changed(self, path: str):
+        self.dirty.add(path)
+        # restart the quiet time
+        self.debounce_timer.start(self.debounce_ms)
+
+    def flush(self):
+        if self.watcher is None:
+            return
+        now = time.time_ns()
+        watched = set(self.watcher.directories())
+        settled = []
+        new_directories = []
+        for path in list(self.dirty):
+            if path not in self.dirty:
+                # forgotten with a directory above it
+                continue
+            try:
+                files, subdirs, _ = scan_directory(path)
+            except OSError:
+                # removed, its pictures are removed from the database
+                files, subdirs = [], []
+            if any(0 <= now - signature[1] < SETTLE_NS for _, signature in files):
+                continue
+            self.dirty.discard(path)
+            listing = self.listing(files, subdirs)
+            previous = self.listings.get(path)
+            if previous == listing:
+                continue
+            self.listings[path] = listing
+            settled.append(path)
+            if previous is not None:
+                for subdir in previous[1] - listing[1]:
+                    # removed or moved away, with its subdirectories
+                    settled.extend(self.forget(subdir))
+            for subdir in subdirs:
+                if subdir not in watched:
+                    # created or moved in, watched and scanned with its subdirectories
+                    new_directories.extend(self.list_directories(subdir))
+        if new_directories and self.watch(new_directories):
+            settled.extend(new_directories)
+        if self.dirty:
+            self.debounce_timer.start(self.debounce_ms)
+        if settled and not self.polling:
+            self.changed.emit(sorted(set(settled)))
@@ -1,48 +1,79 @@
 # -*- coding: utf-8 -*-
 
+import ast
+import logging
 import time
 
 import cv2
 import numpy as np
-import onnxruntime
+from onnxruntime.capi.onnxruntime_pybind11_state import Fail, InvalidArgument
 
+from .session_cache import session_cache
 
-def nms(boxes, scores, iou_threshold):
-    # Sort by score
-    sorted_indices = np.argsort(scores)[::-1]
-
-    keep_boxes = []
-    while sorted_indices.size > 0:
-        # Pick the last box
-        box_id = sorted_indices[0]
-        keep_boxes.append(box_id)
-
-        # Compute IoU of the picked box with the rest
-        ious = compute_iou(boxes[box_id, :], boxes[sorted_indices[1:], :])
-
-        # Remove boxes with IoU over the threshold
-        keep_indices = np.where(ious < iou_threshold)[0]
-
-        # print(keep_indices.shape, sorted_indices.shape)
-        sorted_indices = sorted_indices[keep_indices + 1]
+# highest scoring candidates kept for NMS, bounds the cost on crowded scenes
+# and with low confidence thresholds
+MAX_NMS_CANDIDATES = 3000
 
-    return keep_boxes
 
+def top_k(scores, k):
+    # indices of the k highest scores, unordered
+    if len(scores) <= k:
+        return np.arange(len(scores))
+    return np.argpartition(scores, -k)[-k:]
 
-def multiclass_nms(boxes, scores, class_ids, iou_threshold):
 
-    unique_class_ids = np.unique(class_ids)
+def nms(boxes, scores, iou_threshold):
+    """
+    Non-maxima suppression of xyxy boxes, done by cv2.dnn.NMSBoxes.
 
-    keep_boxes = []
-    for class_id in unique_class_ids:
-        class_indices = np.where(class_ids == class_id)[0]
-        class_boxes = boxes[class_indices, :]
-        class_scores = scores[class_indices]
+    Returns:
+        numpy.ndarray: Indices of the kept boxes, by descending score.
+    """
+    if len(scores) == 0:
+        return np.empty(0, dtype=np.intp)
+    # NMSBoxes takes (x, y, w, h) boxes
+    rects = np.empty((len(boxes), 4), dtype=np.float64)
+    rects[:, :2] = boxes[:, :2]
+    rects[:, 2:] = boxes[:, 2:] - boxes[:, :2]
+    # scores are already filtered by the confidence threshold
+    keep = cv2.dnn.NMSBoxes(
+        rects, np.asarray(scores, dtype=np.float32), 0.0, iou_threshold
+    )
+    return np.asarray(keep, dtype=np.intp).reshape(-1)
+
+
+def multiclass_nms(
+    boxes, scores, class_ids, iou_threshold, max_candidates=MAX_NMS_CANDIDATES
+):
+    """
+    Per class non-maxima suppression of the max_candidates highest scoring boxes.
 
-        class_keep_boxes = nms(class_boxes, class_scores, iou_threshold)
-        keep_boxes.extend(class_indices[class_keep_boxes])
+    The candidates are grouped by class with one sort and each class present
+    is suppressed by one NMS call, instead of looping over the kept boxes.
 
-    return keep_boxes
+    Returns:
+        numpy.ndarray: Indices of the kept boxes, by descending score.
+    """
+    candidates = top_k(scores, max_candidates)
+    if len(candidates) == 0:
+        return candidates
+    class_ids = np.asarray(class_ids)
+    order = candidates[np.argsort(class_ids[candidates], kind="stable")]
+    boxes = np.asarray(boxes)[order]
+    scores = np.asarray(scores)[order]
+
+    # start and end of each class in order
+    bounds = np.flatnonzero(np.diff(class_ids[order])) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(order)]))
+
+    keep = [
+        nms(boxes[start:end], scores[start:end], iou_threshold) + start
+        for start, end in zip(starts, ends)
+    ]
+    keep = np.concatenate(keep)
+    keep = keep[np.argsort(-scores[keep], kind="stable")]
+    return order[keep]
 
 
 def compute_iou(box, boxes):
@@ -66,6 +97,17 @@ def compute_iou(box, boxes):
     return iou
 
 
+def is_shape_error(error: Exception):
+    """
+    Whether an onnxruntime error is about the shape of the input, as raised by
+    models whose batch dimension is only dynamic in name.
+    """
+    message = str(error).lower()
+    return isinstance(error, (Fail, InvalidArgument)) and (
+        "shape" in message or "dimension" in message
+    )
+
+
 def xywh2xyxy(x):
     # Convert bounding box (x, y, w, h) to bounding box (x1, y1, x2, y2)
     y = np.copy(x)
@@ -77,11 +119,12 @@ def xywh2xyxy(x):
 
 
 class YOLO11Base:
+    # keep the aspect ratio and pad to the input size instead of stretching
+    letterbox = False
 
     def initialize_model(self, path):
-        self.session = onnxruntime.InferenceSession(
-            path, providers=onnxruntime.get_available_providers()
-        )
+        # sessions are shared process-wide, see session_cache.SessionCache
+        self.session = session_cache.get(path)
         # Get model info
         self.get_input_details()
         self.get_output_details()
@@ -94,35 +137,131 @@ class YOLO11Base:
         self.input_height = self.input_shape[2]
         self.input_width = self.input_shape[3]
 
+        # models exported with dynamic=True have symbolic dims, read the
+        # export size from the ultralytics metadata instead
+        if not isinstance(self.input_height, int) or not isinstance(
+            self.input_width, int
+        ):
+            metadata = self.session.get_modelmeta().custom_metadata_map
+            imgsz = ast.literal_eval(metadata.get("imgsz", "[640, 640]"))
+            self.input_height, self.input_width = int(imgsz[0]), int(imgsz[1])
+
+        # None for a dynamic batch dimension, otherwise the fixed batch size
+        batch = self.input_shape[0]
+        self.batch_size = batch if isinstance(batch, int) and batch > 0 else None
+
     def get_output_details(self):
         model_outputs = self.session.get_outputs()
         self.output_names = [model_outputs[i].name for i in range(len(model_outputs))]
 
-    def prepare_input(self, image: np.ndarray):
-        self.img_height, self.img_width = image.shape[:2]
+    def letterbox_params(self, img_height, img_width):
+        # scale ratio and (x, y) padding of the letterboxed image
+        ratio = min(self.input_width / img_width, self.input_height / img_height)
+        new_width = min(round(img_width * ratio), self.input_width)
+        new_height = min(round(img_height * ratio), self.input_height)
+        pad_x = (self.input_width - new_width) // 2
+        pad_y = (self.input_height - new_height) // 2
+        return ratio, (new_width, new_height), (pad_x, pad_y)
+
+    def resize_input(self, image: np.ndarray):
+        # Convert the image to 3 channel BGR if it is in grayscale or has alpha
+        if len(image.shape) == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+
+        if not self.letterbox:
+            return cv2.resize(image, (self.input_width, self.input_height))
+
+        _, new_size, (pad_x, pad_y) = self.letterbox_params(*image.shape[:2])
+        canvas = getattr(self, "_canvas", None)
+        if canvas is None:
+            canvas = np.empty((self.input_height, self.input_width, 3), np.uint8)
+            self._canvas = canvas
+        canvas.fill(114)
+        canvas[pad_y : pad_y + new_size[1], pad_x : pad_x + new_size[0]] = cv2.resize(
+            image, new_size, interpolation=cv2.INTER_LINEAR
+        )
+        return canvas
+
+    def get_input_buffer(self, batch: int):
+        buffer = getattr(self, "_input_buffer", None)
+        if buffer is None or buffer.shape[0] < batch:
+            buffer = np.empty(
+                (batch, 3, self.input_height, self.input_width), np.float32
+            )
+            self._input_buffer = buffer
+        return buffer[:batch]
+
+    def prepare_batch(self, images: list[np.ndarray], batch: int = 0):
+        """
+        Preprocesses images into a reusable NCHW float32 buffer.
 
-        # Resize input image
-        input_img = cv2.resize(image, (self.input_width, self.input_height))
-        # input_img = image
+        The returned tensor is a view of the buffer and is overwritten by the
+        next call, so it has to be consumed before preparing another batch.
 
-        # Convert the image to RGB if it is in grayscale
-        if len(input_img.shape) == 2:
-            input_img = cv2.cvtColor(input_img, cv2.COLOR_GRAY2RGB)
-        else:
-            input_img = cv2.cvtColor(input_img, cv2.COLOR_BGR2RGB)
-        # Scale input pixel values to 0 to 1
-        input_img = input_img / 255.0
-        input_img = input_img.transpose(2, 0, 1)
-        input_tensor = input_img[np.newaxis, :, :, :].astype(np.float32)
+        Args:
+            images (list[np.ndarray]): The input images, BGR or grayscale.
+            batch (int, optional): Size of the tensor, extra rows are zero padded.
 
+        Returns:
+            numpy.ndarray: The input tensor.
+        """
+        input_tensor = self.get_input_buffer(max(batch, len(images)))
+        scale = np.float32(1 / 255.0)
+        for i, image in enumerate(images):
+            input_img = self.resize_input(image)
+            # BGR HWC uint8 to RGB CHW float32 0-1, written in place
+            np.multiply(input_img.transpose(2, 0, 1)[::-1], scale, out=input_tensor[i])
+        input_tensor[len(images) :] = 0
         return input_tensor
 
+    def prepare_input(self, image: np.ndarray):
+        self.img_height, self.img_width = image.shape[:2]
+        # a fixed batch model takes its whole batch, the other rows are zero
+        return self.prepare_batch([image], self.batch_size or 0)
+
     def inference(self, input_tensor):
         outputs = self.session.run(
             self.output_names, {self.input_names[0]: input_tensor}
         )
         return outputs
 
+    def inference_batch(self, images: list[np.ndarray]):
+        """
+        Runs inference on a list of images with as few session runs as possible.
+
+        Args:
+            images (list[np.ndarray]): The input images.
+
+        Returns:
+            list: The model outputs of each image, with a batch dimension of 1.
+        """
+        results = []
+        start = 0
+        while start < len(images):
+            chunk = images[start : start + (self.batch_size or len(images))]
+            # the chunks of a fixed batch model are zero padded to its batch
+            input_tensor = self.prepare_batch(chunk, self.batch_size or 0)
+            try:
+                outputs = self.inference(input_tensor)
+            except Exception as e:
+                if self.batch_size is not None or len(chunk) == 1:
+                    raise
+                if not is_shape_error(e):
+                    raise
+                # a dynamic batch dimension the model does not really support
+                logging.warning(
+                    f"Batched inference failed, falling back to single images: {e}"
+                )
+                self.batch_size = 1
+                continue
+            results.extend(
+                [[output[i : i + 1] for output in outputs] for i in range(len(chunk))]
+            )
+            start += len(chunk)
+        return results
+
 
 class YOLO11(YOLO11Base):
     """
@@ -139,6 +278,8 @@ class YOLO11(YOLO11Base):
         class_ids (numpy.ndarray): The predicted class IDs of the detected objects.
     """
 
+    letterbox = True
+
     def __init__(self, path, conf_thres=0.7, iou_thres=0.5):
         self.conf_threshold = conf_thres
         self.iou_threshold = iou_thres
@@ -161,42 +302,71 @@ class YOLO11(YOLO11Base):
             scores (numpy.ndarray): The confidence scores of the detected objects.
             class_ids (numpy.ndarray): The predicted class IDs of the detected objects.
         """
-        input_tensor = self.prepare_input(image)
+        self.img_height, self.img_width = image.shape[:2]
 
         # Perform inference on the image
-        outputs = self.inference(input_tensor)
+        outputs = self.inference_batch([image])[0]
 
         self.boxes, self.scores, self.class_ids = self.process_output(outputs)
 
         return self.boxes, self.scores, self.class_ids
 
+    def detect_batch(self, images: list[np.ndarray]):
+        """
+        Detects objects in a list of images, running them through the model in one batch.
+
+        Args:
+            images: The input images.
+
+        Returns:
+            list: (boxes, scores, class_ids) of each image, as returned by detect_objects.
+        """
+        outputs = self.inference_batch(images)
+
+        results = []
+        for image, output in zip(images, outputs):
+            self.img_height, self.img_width = image.shape[:2]
+            results.append(self.process_output(output))
+        return results
+
     def process_output(self, output):
-        predictions = np.squeeze(output[0]).T
+        """
+        Decodes the detections of one image.
+
+        The output is (1, 4 + classes, anchors) or (4 + classes, anchors), each
+        class score row is contiguous. Anchors are filtered on those rows before
+        anything is transposed, so only the candidates are copied.
+
+        Args:
+            output (list[numpy.ndarray]): The model outputs of one image.
+
+        Returns:
+            boxes, scores, class_ids of the detections, as in detect_objects.
+        """
+        predictions = output[0]
+        predictions = predictions.reshape(predictions.shape[-2:])
+        class_scores = predictions[4:]
 
         # Filter out object confidence scores below threshold
-        scores = np.max(predictions[:, 4:], axis=1)
-        predictions = predictions[scores > self.conf_threshold, :]
-        scores = scores[scores > self.conf_threshold]
+        scores = class_scores.max(axis=0)
+        candidates = np.flatnonzero(scores > self.conf_threshold)
 
-        if len(scores) == 0:
+        if len(candidates) == 0:
             return [], [], []
 
+        scores = scores[candidates]
         # Get the class with the highest confidence
-        class_ids = np.argmax(predictions[:, 4:], axis=1)
+        class_ids = class_scores[:, candidates].argmax(axis=0)
 
         # Get bounding boxes for each object
-        boxes = self.extract_boxes(predictions)
+        boxes = self.extract_boxes(predictions[:4, candidates].T)
 
         # Apply non-maxima suppression to suppress weak, overlapping bounding boxes
-        # indices = nms(boxes, scores, self.iou_threshold)
         indices = multiclass_nms(boxes, scores, class_ids, self.iou_threshold)
 
         return boxes[indices], scores[indices], class_ids[indices]
 
-    def extract_boxes(self, predictions):
-        # Extract boxes from predictions
-        boxes = predictions[:, :4]
-
+    def extract_boxes(self, boxes):
         # Scale boxes to original image dimensions
         boxes = self.rescale_boxes(boxes)
 
@@ -207,14 +377,12 @@ class YOLO11(YOLO11Base):
 
     def rescale_boxes(self, boxes):
 
-        # Rescale boxes to original image dimensions
-        input_shape = np.array(
-            [self.input_width, self.input_height, self.input_width, self.input_height]
-        )
-        boxes = np.divide(boxes, input_shape, dtype=np.float32)
-        boxes *= np.array(
-            [self.img_width, self.img_height, self.img_width, self.img_height]
+        # Undo the letterbox padding and scaling to original image dimensions
+        ratio, _, (pad_x, pad_y) = self.letterbox_params(
+            self.img_height, self.img_width
         )
+        boxes = np.subtract(boxes, [pad_x, pad_y, 0, 0], dtype=np.float32)
+        boxes /= ratio
         return boxes
 
 
@@ -251,15 +419,27 @@ class YOLO11Cls(YOLO11Base):
         class_ids: numpy.ndarray: The predicted class IDs of the detected objects.
         confidence: numpy.ndarray: The confidence scores of the detected objects.
         """
-        input_tensor = self.prepare_input(image)
-
         # Perform inference on the image
-        outputs = self.inference(input_tensor)
+        outputs = self.inference_batch([image])[0]
 
         class_ids, confidence = self.process_output(outputs)
 
         return class_ids, confidence
 
+    def predict_batch(self, images: list[np.ndarray]):
+        """
+        Classifies a list of images, running them through the model in one batch.
+
+        Args:
+            images (list[np.ndarray]): The input images.
+
+        Returns:
+            list: (class_ids, confidence) of each image, as returned by predict.
+        """
+        outputs = self.inference_batch(images)
+
+        return [self.process_output(output) for output in outputs]
+
     def process_output(self, output):
         """
         Processes the output tensor to get the predicted class IDs of the detected objects.
@@ -1 +1,8 @@
+from .session_cache import (
+    SessionCache,
+    cpu_only,
+    profile_providers,
+    session_cache,
+    session_options_from_settings,
+)
 from .YOLO import YOLO11, YOLO11Cls
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import onnxruntime
+
+# execution providers of each provider profile, in order of preference
+PROVIDER_PROFILES = {
+    "Auto": None,
+    "CPU": ["CPUExecutionProvider"],
+    "CUDA": ["CUDAExecutionProvider", "CPUExecutionProvider"],
+    "DirectML": ["DmlExecutionProvider", "CPUExecutionProvider"],
+}
+
+# providers that run the models on an accelerator instead of the CPU
+ACCELERATED_PROVIDERS = {
+    "CUDAExecutionProvider",
+    "TensorrtExecutionProvider",
+    "ROCMExecutionProvider",
+    "DmlExecutionProvider",
+    "CoreMLExecutionProvider",
+    "OpenVINOExecutionProvider",
+}
+
+# SessionOptions attributes set in the settings, with the onnxruntime defaults
+SESSION_OPTION_DEFAULTS = {
+    "intra_op_num_threads": 0,
+    "inter_op_num_threads": 0,
+    "graph_optimization_level": "ORT_ENABLE_ALL",
+    "execution_mode": "ORT_SEQUENTIAL",
+    "enable_cpu_mem_arena": True,
+}
+
+# SessionOptions attributes given by enum member name
+SESSION_OPTION_ENUMS = {
+    "graph_optimization_level": onnxruntime.GraphOptimizationLevel,
+    "execution_mode": onnxruntime.ExecutionMode,
+}
+
+
+def session_options_from_settings(settings: dict) -> dict:
+    """
+    Returns the SessionOptions attributes of the settings that differ from
+    the onnxruntime defaults.
+    """
+    return {
+        name: settings[name]
+        for name, default in SESSION_OPTION_DEFAULTS.items()
+        if name in settings and settings[name] != default
+    }
+
+
+def profile_providers(profile: str | None = None):
+    """
+    Returns the available execution providers of a provider profile, or None
+    for all available providers when the profile is Auto or unknown.
+    """
+    providers = PROVIDER_PROFILES.get(profile)
+    if providers is None:
+        return None
+    available = onnxruntime.get_available_providers()
+    providers = [provider for provider in providers if provider in available]
+    if len(providers) == 0:
+        logging.warning(f"Providers of profile {profile} not available, using CPU")
+        return ["CPUExecutionProvider"]
+    return providers
+
+
+def cpu_only(providers: list[str] | None = None):
+    """
+    Whether the models run on the CPU with these providers, None for all
+    available providers.
+    """
+    if providers is None:
+        providers = onnxruntime.get_available_providers()
+    return not any(provider in ACCELERATED_PROVIDERS for provider in providers)
+
+
+class SessionCache:
+    """
+    Process-wide cache of onnxruntime InferenceSessions.
+
+    Sessions are keyed by (model file, providers, session options) so a model is
+    loaded once and shared by every YOLO11/YOLO11Cls instance and worker.
+    Least recently used sessions are evicted once the estimated memory of the
+    loaded models exceeds the memory budget.
+
+    When optimized_model_dir is set, the graph optimized by onnxruntime is
+    saved there on the first load and later loads skip the graph optimization.
+
+    Args:
+        memory_budget (int, optional): Memory budget in bytes. Defaults to 2 GiB.
+        session_options (dict, optional): Default SessionOptions attributes,
+            used when get() is called without session options.
+        providers (list[str], optional): Default execution providers, used when
+            get() is called without providers. Defaults to all available.
+        optimized_model_dir (str | Path, optional): Directory of the optimized models.
+    """
+
+    def __init__(
+        self,
+        memory_budget: int = 2 * 1024**3,
+        session_options: dict | None = None,
+        providers: list[str] | None = None,
+        optimized_model_dir=None,
+    ):
+        self.memory_budget = memory_budget
+        self.session_options = session_options or {}
+        self.providers = providers
+        self.optimized_model_dir = optimized_model_dir
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    @staticmethod
+    def make_key(path, providers=None, session_options: dict | None = None):
+        if providers is None:
+            providers = onnxruntime.get_available_providers()
+        options = tuple(sorted((session_options or {}).items()))
+        return (Path(path).resolve().as_posix(), tuple(providers), options)
+
+    @staticmethod
+    def build_session_options(session_options: dict | None = None):
+        sess_options = onnxruntime.SessionOptions()
+        for name, value in (session_options or {}).items():
+            if name in SESSION_OPTION_ENUMS and isinstance(value, str):
+                value = getattr(SESSION_OPTION_ENUMS[name], value)
+            setattr(sess_options, name, value)
+        return sess_options
+
+    def configure(
+        self,
+        session_options: dict | None = None,
+        providers: list[str] | None = None,
+        optimized_model_dir=None,
+    ):
+        """
+        Sets the defaults used by get(), sessions already loaded with other
+        settings stay cached until they are evicted.
+        """
+        with self._lock:
+            self.session_options = session_options or {}
+            self.providers = providers
+            self.optimized_model_dir = optimized_model_dir
+
+    def optimized_model(self, path: str, providers, session_options: dict):
+        """
+        Returns the model path and session options to load a model with, using
+        the saved optimized model when it is newer than the model.
+        """
+        level = session_options.get("graph_optimization_level", "ORT_ENABLE_ALL")
+        if self.optimized_model_dir is None or level == "ORT_DISABLE_ALL":
+            return path, session_options, None
+
+        # optimized graphs depend on the optimization level and the provider
+        optimized = Path(self.optimized_model_dir) / (
+            f"{Path(path).stem}.{level}.{providers[0]}.onnx"
+        )
+        if (
+            optimized.exists()
+            and optimized.stat().st_mtime >= Path(path).stat().st_mtime
+        ):
+            return (
+                optimized.as_posix(),
+                {**session_options, "graph_optimization_level": "ORT_DISABLE_ALL"},
+                None,
+            )
+        optimized.parent.mkdir(parents=True, exist_ok=True)
+        # saved under a temporary name, other processes may load the same model
+        temp = optimized.with_name(f"{optimized.name}.{os.getpid()}.tmp")
+        return (
+            path,
+            {**session_options, "optimized_model_filepath": temp.as_posix()},
+            (temp, optimized),
+        )
+
+    def get(self, path, providers=None, session_options: dict | None = None):
+        """
+        Returns a cached InferenceSession, loading the model on a cache miss.
+
+        Args:
+            path (str | Path): The path to the ONNX model file.
+            providers (list[str], optional): Execution providers. Defaults to the
+                cache wide providers.
+            session_options (dict, optional): SessionOptions attributes to set.
+                Defaults to the cache wide session_options.
+        """
+        if providers is None:
+            providers = self.providers
+        if session_options is None:
+            session_options = self.session_options
+        key = self.make_key(path, providers, session_options)
+        with self._lock:
+            if key in self._sessions:
+                self._sessions.move_to_end(key)
+                self.hits += 1
+                return self._sessions[key][0]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # load outside the cache lock so other models are not blocked,
+        # but make concurrent requests for the same key wait for one load
+        with load_lock:
+            with self._lock:
+                if key in self._sessions:
+                    self._sessions.move_to_end(key)
+                    self.hits += 1
+                    return self._sessions[key][0]
+                self.misses += 1
+
+            start = time.perf_counter()
+            session = self.load(key[0], list(key[1]), session_options)
+            elapsed = time.perf_counter() - start
+            logging.info(f"Loaded model {key[0]} in {elapsed:.3f}s")
+
+            with self._lock:
+                self.load_time += elapsed
+                self._sessions[key] = (session, self.estimate_size(key[0]))
+                self._evict()
+                self._load_locks.pop(key, None)
+            return session
+
+    def load(self, path: str, providers: list[str], session_options: dict):
+        load_path, load_options, save = self.optimized_model(
+            path, providers, session_options
+        )
+        try:
+            session = onnxruntime.InferenceSession(
+                load_path,
+                sess_options=self.build_session_options(load_options),
+                providers=providers,
+            )
+        except Exception as e:
+            if load_path == path:
+                raise
+            logging.warning(f"Loading optimized model {load_path} failed: {e}")
+            return onnxruntime.InferenceSession(
+                path,
+                sess_options=self.build_session_options(session_options),
+                providers=providers,
+            )
+        if save is not None:
+            try:
+                os.replace(*save)
+                logging.info(f"Saved optimized model {save[1]}")
+            except OSError as e:
+                logging.warning(f"Saving optimized model {save[1]} failed: {e}")
+        return session
+
+    @staticmethod
+    def estimate_size(path: str) -> int:
+        # the weights dominate session memory, use the file size as estimate
+        try:
+            return Path(path).stat().st_size
+        except OSError:
+            return 0
+
+    def memory_usage(self) -> int:
+        return sum(size for _, size in self._sessions.values())
+
+    def _evict(self):
+        # always keep the most recently used session
+        while len(self._sessions) > 1 and self.memory_usage() > self.memory_budget:
+            key, _ = self._sessions.popitem(last=False)
+            self.evictions += 1
+            logging.debug(f"Evicted model {key[0]} from session cache")
+
+    def set_memory_budget(self, memory_budget: int):
+        with self._lock:
+            self.memory_budget = memory_budget
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_time": self.load_time,
+                "sessions": len(self._sessions),
+                "memory_usage": self.memory_usage(),
+            }
+
+
+session_cache = SessionCache()
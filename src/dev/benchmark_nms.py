@@ -0,0 +1,88 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.yolo.YOLO import compute_iou, multiclass_nms  # noqa: E402
+
+
+def loop_nms(boxes, scores, iou_threshold):
+    # the previous per box implementation, kept as reference
+    sorted_indices = np.argsort(scores)[::-1]
+
+    keep_boxes = []
+    while sorted_indices.size > 0:
+        box_id = sorted_indices[0]
+        keep_boxes.append(box_id)
+        ious = compute_iou(boxes[box_id, :], boxes[sorted_indices[1:], :])
+        keep_indices = np.where(ious < iou_threshold)[0]
+        sorted_indices = sorted_indices[keep_indices + 1]
+
+    return keep_boxes
+
+
+def loop_multiclass_nms(boxes, scores, class_ids, iou_threshold):
+    keep_boxes = []
+    for class_id in np.unique(class_ids):
+        class_indices = np.where(class_ids == class_id)[0]
+        class_keep_boxes = loop_nms(
+            boxes[class_indices, :], scores[class_indices], iou_threshold
+        )
+        keep_boxes.extend(class_indices[class_keep_boxes])
+
+    return keep_boxes
+
+
+def crowded_scene(num_boxes, num_classes, seed=0):
+    # boxes clustered around a few objects, like a low confidence threshold gives
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, 640, (max(num_boxes // 20, 1), 2))
+    center_classes = rng.integers(0, num_classes, len(centers))
+    center_ids = rng.integers(0, len(centers), num_boxes)
+    xy = centers[center_ids]
+    xy += rng.normal(0, 8, (num_boxes, 2))
+    wh = rng.uniform(20, 120, (num_boxes, 2))
+    boxes = np.concatenate([xy - wh / 2, xy + wh / 2], axis=1).astype(np.float32)
+    scores = rng.uniform(0.05, 1, num_boxes).astype(np.float32)
+    class_ids = center_classes[center_ids]
+    return boxes, scores, class_ids
+
+
+def benchmark(function, repeat, *args):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args)
+    return (time.perf_counter() - start) / repeat, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare multiclass_nms with the per box loop implementation"
+    )
+    parser.add_argument("--boxes", type=int, nargs="+", default=[100, 1000, 8400])
+    parser.add_argument("--classes", type=int, default=80)
+    parser.add_argument("--iou", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(
+        f"{'boxes':>8} {'loop ms':>10} {'vectorized ms':>14} {'speedup':>8} {'kept':>6}"
+    )
+    for num_boxes in args.boxes:
+        boxes, scores, class_ids = crowded_scene(num_boxes, args.classes)
+        loop_time, loop_keep = benchmark(
+            loop_multiclass_nms, args.repeat, boxes, scores, class_ids, args.iou
+        )
+        fast_time, fast_keep = benchmark(
+            multiclass_nms, args.repeat, boxes, scores, class_ids, args.iou
+        )
+        # the top-k pre-filter may drop low scoring boxes the loop keeps
+        same = "" if set(loop_keep) == set(fast_keep) else " (differs)"
+        print(
+            f"{num_boxes:>8} {loop_time * 1000:>10.2f} {fast_time * 1000:>14.2f} "
+            f"{loop_time / fast_time:>7.1f}x {len(fast_keep):>6}{same}"
+        )
@@ -0,0 +1,70 @@
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.image_process import file_signature  # noqa: E402
+from backend.scanner import SCAN_THREADS, SUPPORTED_SUFFIXES, scan_files  # noqa: E402
+
+
+def rglob_scan(folder: Path):
+    # the previous walk, kept as reference
+    supported_suffix = list(SUPPORTED_SUFFIXES)
+    files = []
+    for file in folder.rglob("*"):
+        if file.is_file() and file.suffix.lower() in supported_suffix:
+            files.append((file, file_signature(file.stat())))
+    return files
+
+
+def scandir_scan(folder: Path, threads: int):
+    return [file for files in scan_files(folder, threads) for file in files]
+
+
+def make_tree(folder: Path, dirs: int, files_per_dir: int):
+    # empty files, half of them images
+    for d in range(dirs):
+        directory = folder / f"{d % 10}" / f"dir{d}"
+        directory.mkdir(parents=True, exist_ok=True)
+        for f in range(files_per_dir):
+            suffix = ".jpg" if f % 2 == 0 else ".txt"
+            (directory / f"file{f}{suffix}").touch()
+
+
+def benchmark(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the os.scandir scanner with the Path.rglob walk"
+    )
+    parser.add_argument(
+        "--folder", type=Path, help="Folder to walk, else a tree is made"
+    )
+    parser.add_argument("--dirs", type=int, default=500)
+    parser.add_argument("--files", type=int, default=100, help="Files per directory")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, SCAN_THREADS])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        folder = args.folder
+        if folder is None:
+            folder = Path(temp_dir)
+            make_tree(folder, args.dirs, args.files)
+
+        rglob_time, rglob_files = benchmark(rglob_scan, folder)
+        print(f"{'walk':>14} {'seconds':>8} {'speedup':>8} {'files':>8}")
+        print(f"{'rglob':>14} {rglob_time:>8.3f} {'':>8} {len(rglob_files):>8}")
+        for threads in args.threads:
+            scan_time, scan_files_found = benchmark(scandir_scan, folder, threads)
+            same = "" if set(scan_files_found) == set(rglob_files) else " (differs)"
+            print(
+                f"{f'scandir x{threads}':>14} {scan_time:>8.3f} "
+                f"{rglob_time / scan_time:>7.1f}x {len(scan_files_found):>8}{same}"
+            )
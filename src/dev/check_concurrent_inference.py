@@ -0,0 +1,121 @@
+import argparse
+import queue
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.pipeline import (  # noqa: E402
+    BatchIndexer,
+    ClassificationStage,
+    ObjectDetectionStage,
+)
+from backend.scheduler import ThreadBudget  # noqa: E402
+
+
+def make_images(count: int, seed: int = 0):
+    # random sizes, so every image is scaled differently
+    rng = np.random.default_rng(seed)
+    return [
+        rng.integers(
+            0, 256, (rng.integers(64, 800), rng.integers(64, 800), 3), np.uint8
+        )
+        for _ in range(count)
+    ]
+
+
+def run_stage(stage, images: list, threads: int):
+    image_queue = queue.Queue()
+    for item in enumerate(images):
+        image_queue.put(item)
+    image_queue.put(None)
+    results = {}
+    stage.kwargs["scheduler"] = ThreadBudget(threads, 1)
+    stage.run(image_queue, lambda result: results.update(result))
+    return [results[i] for i in range(len(images))]
+
+
+def run_batch(images: list, threads: int, timeout: float):
+    """
+    Runs BatchIndexer with object detection on images saved as JPEGs, with the
+    default images in flight. Returns the number of results, None if the
+    batch did not finish within timeout seconds.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for i, image in enumerate(images):
+            path = Path(folder) / f"{i}.jpg"
+            cv2.imwrite(str(path), image)
+            paths.append(path)
+        results = []
+        batch = BatchIndexer(
+            paths,
+            on_results=results.extend,
+            classification_model="None",
+            classification_threshold=0.5,
+            object_detection_model="YOLO11n",
+            object_detection_dataset=["COCO"],
+            object_detection_conf_threshold=0.5,
+            object_detection_iou_threshold=0.5,
+            OCR_model="None",
+            thread_budget=threads,
+        )
+        thread = threading.Thread(target=batch.run, daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            return None
+        return len(results)
+
+
+def same(a: list, b: list):
+    return len(a) == len(b) and all(
+        name_a == name_b and np.isclose(score_a, score_b, atol=1e-5)
+        for (name_a, score_a), (name_b, score_b) in zip(a, b)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the model stages give the same results when "
+        "their chunks run at once as when they run one after another, and that "
+        "a batch with more images than fit in flight finishes"
+    )
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--chunk", type=int, default=4, help="Images per task")
+    parser.add_argument(
+        "--timeout", type=float, default=60, help="Seconds to wait for the batch"
+    )
+    args = parser.parse_args()
+
+    images = make_images(args.images)
+    stages = {
+        "classification": lambda: ClassificationStage(
+            "YOLO11n", 0.01, inference_batch_size=args.chunk
+        ),
+        "object_detection": lambda: ObjectDetectionStage(
+            "YOLO11n", ["COCO"], 0.05, 0.5, inference_batch_size=args.chunk
+        ),
+    }
+    failed = False
+    for name, make_stage in stages.items():
+        sequential = run_stage(make_stage(), images, 1)
+        concurrent = run_stage(make_stage(), images, args.threads)
+        differ = sum(not same(a, b) for a, b in zip(sequential, concurrent))
+        print(f"{name}: {differ} of {len(images)} images differ")
+        failed = failed or differ > 0
+    # the stages must not wait for images the reader can't read until the
+    # images they hold leave the pipeline
+    indexed = run_batch(images, args.threads, args.timeout)
+    if indexed is None:
+        print(f"batch: not finished after {args.timeout}s")
+    else:
+        print(f"batch: {indexed} of {len(images)} images indexed")
+    failed = failed or indexed != len(images)
+    sys.exit(1 if failed else 0)
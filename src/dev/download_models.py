@@ -31,8 +31,9 @@ if __name__ == "__main__":
     os.makedirs(Path(__file__).parent.parent / "models", exist_ok=True)
     for model_name in model_names:
         model = YOLO(model_name)  # load a pretrained model (recommended for training)
+        # dynamic batch dimension for batched inference, see YOLO11Base.inference_batch
         path = model.export(
-            format="onnx", dynamic=False
+            format="onnx", dynamic=True
         )  # export the model to ONNX format.
         shutil.move(
             path,
@@ -0,0 +1,140 @@
+import argparse
+import logging
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.model_registry import (  # noqa: E402
+    CLASSIFICATION_MODELS,
+    DETECTION_MODELS,
+    QUANTIZED_SUFFIX,
+    quantized_file,
+)
+from backend.yolo import YOLO11, YOLO11Cls  # noqa: E402
+
+SUPPORTED_SUFFIX = {".bmp", ".jpeg", ".jpg", ".png", ".webp", ".tif", ".tiff"}
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    """
+    Feeds calibration images to quantize_static, preprocessed the same way
+    as for inference.
+    """
+
+    def __init__(self, yolo, image_paths: list[Path]):
+        self.yolo = yolo
+        self.image_paths = iter(image_paths)
+
+    def get_next(self):
+        for path in self.image_paths:
+            image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            # prepare_input returns a reused buffer
+            input_tensor = self.yolo.prepare_input(image).copy()
+            return {self.yolo.input_names[0]: input_tensor}
+        return None
+
+
+def calibration_images(folder: Path, samples: int, seed: int = 0):
+    """
+    Returns a random sample of the images indexed in folder, or of the images
+    in folder when it has no database.
+    """
+    db_path = folder / "PicFinder.db"
+    if db_path.exists():
+        conn = sqlite3.connect(db_path)
+        paths = [folder / row[0] for row in conn.execute("SELECT path FROM paths")]
+        conn.close()
+    else:
+        paths = [
+            path
+            for path in folder.rglob("*")
+            if path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIX
+        ]
+    random.Random(seed).shuffle(paths)
+    return paths[:samples]
+
+
+def quantize(model_path: Path, output_path: Path, reader=None):
+    """
+    Quantizes a model to INT8, statically with the calibration reader or
+    dynamically without one.
+    """
+    if reader is None:
+        quantize_dynamic(model_path, output_path, weight_type=QuantType.QUInt8)
+        return
+
+    preprocessed = output_path.with_name(output_path.name + ".pre.onnx")
+    try:
+        quant_pre_process(model_path, preprocessed)
+        source = preprocessed
+    except Exception as e:
+        logging.warning(f"Preprocessing {model_path} failed, quantizing as is: {e}")
+        source = model_path
+    try:
+        quantize_static(
+            source,
+            output_path,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+        )
+    finally:
+        preprocessed.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Make INT8 variants of the models in the models directory"
+    )
+    parser.add_argument(
+        "--images",
+        type=Path,
+        help="Indexed folder to calibrate on, dynamic quantization without it",
+    )
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--models", nargs="+", help="Model names, defaults to all")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    models_dir = Path(__file__).parent.parent / "models"
+    images = None
+    if args.images is not None:
+        images = calibration_images(args.images, args.samples)
+        logging.info(f"Calibrating on {len(images)} images from {args.images}")
+
+    for models, model_class in (
+        (CLASSIFICATION_MODELS, YOLO11Cls),
+        (DETECTION_MODELS, YOLO11),
+    ):
+        for model, file in models.items():
+            if model.endswith(QUANTIZED_SUFFIX):
+                continue
+            if args.models is not None and model not in args.models:
+                continue
+            model_path = models_dir / file
+            if not model_path.exists():
+                continue
+            output_path = models_dir / quantized_file(file)
+            reader = None
+            if images:
+                reader = ImageCalibrationReader(model_class(model_path), images)
+            logging.info(f"Quantizing {model_path} to {output_path}")
+            quantize(model_path, output_path, reader)
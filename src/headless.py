@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Watch mode of the command line indexer. Imported only with --watch, a single
+index run does not need Qt.
+"""
+
+import logging
+import time
+from pathlib import Path
+
+from PySide6.QtCore import QCoreApplication, QObject, QThread
+
+from backend.qtworkers import IndexWorker
+from backend.watcher import FolderWatcher
+
+
+class HeadlessIndexer(QObject):
+    """
+    Runs IndexWorker on a folder, and indexes the changes reported by
+    FolderWatcher once the running index is done, like the watch mode of
+    MainWindow.
+
+    Args:
+        folder_path (Path): The folder to index.
+        settings (dict): IndexWorker settings.
+        on_indexed (callable, optional): Called with the number of files and
+            the seconds of each index run.
+    """
+
+    def __init__(self, folder_path: Path, settings: dict, on_indexed=None):
+        super(HeadlessIndexer, self).__init__()
+        self.folder = folder_path
+        self.settings = settings
+        self.on_indexed = on_indexed
+        self.watcher = None
+        self.index_worker = None
+        self.watch_directories = set()
+        self.watch_rescan = False
+        self.stopping = False
+
+    def start(self):
+        self.watcher = FolderWatcher(
+            self.folder,
+            self.settings["watch_polling"],
+            self.settings["watch_poll_interval"],
+        )
+        self.watcher_thread = QThread()
+        self.watcher.moveToThread(self.watcher_thread)
+        self.watcher_thread.started.connect(self.watcher.run)
+        self.watcher.changed.connect(self.folder_changed)
+        self.watcher.rescan.connect(self.folder_rescan)
+        self.watcher_thread.start()
+        self.start_index_worker(self.settings)
+
+    def stop(self):
+        # a running index finishes first so the database is left consistent
+        self.stopping = True
+        if self.watcher is not None:
+            self.watcher_thread.quit()
+            self.watcher_thread.wait()
+            self.watcher = None
+        if self.index_worker is None:
+            QCoreApplication.quit()
+        else:
+            logging.info("Stopping after the running index")
+
+    def start_index_worker(self, settings: dict):
+        self.index_worker = IndexWorker(self.folder, **settings)
+        self.index_thread = QThread()
+        self.index_worker.moveToThread(self.index_thread)
+        self.index_thread.started.connect(self.index_worker.run)
+        self.index_worker.finished.connect(self.index_finished)
+        self.start_time = time.perf_counter()
+        self.index_thread.start()
+
+    def index_finished(self):
+        if self.on_indexed is not None:
+            self.on_indexed(
+                self.index_worker.indexer.indexed_files,
+                time.perf_counter() - self.start_time,
+            )
+        self.index_thread.quit()
+        self.index_thread.wait()
+        self.index_worker = None
+        if self.stopping:
+            self.stop()
+        else:
+            self.index_watched()
+
+    def folder_changed(self, directories: list):
+        self.watch_directories.update(directories)
+        self.index_watched()
+
+    def folder_rescan(self):
+        self.watch_rescan = True
+        self.index_watched()
+
+    def index_watched(self):
+        if self.index_worker is not None or self.stopping:
+            return
+        if not self.watch_rescan and not self.watch_directories:
+            return
+        settings = {**self.settings, "FullUpdate": False}
+        if not self.watch_rescan:
+            settings["scan_directories"] = sorted(self.watch_directories)
+        self.watch_directories.clear()
+        self.watch_rescan = False
+        self.start_index_worker(settings)
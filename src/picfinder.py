@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Command line indexer, runs without a display.
+
+    python -m picfinder index <folder> --workers N --batch-size M
+
+Indexes with the settings saved by the application, options override them.
+A single run uses the backend without Qt, and without PySide6 installed runs
+with the default settings. With --watch it keeps running and indexes the
+changes of the folder, for systemd services. Logs go to stderr,
+the throughput of each run to stdout.
+"""
+
+import argparse
+import logging
+import signal
+import sys
+import time
+from multiprocessing import freeze_support
+from pathlib import Path
+
+from backend.indexer import Indexer
+from settings import load_settings
+
+
+def print_throughput(files: int, elapsed: float):
+    rate = files / elapsed if elapsed > 0 else 0.0
+    print(f"Indexed {files} files in {elapsed:.2f}s ({rate:.2f} files/s)", flush=True)
+
+
+def index_once(folder: Path, settings: dict):
+    indexer = Indexer(folder, **settings)
+    # the running batches finish first so the database is left consistent
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: indexer.stop())
+    start_time = time.perf_counter()
+    indexer.run()
+    print_throughput(indexer.indexed_files, time.perf_counter() - start_time)
+    return 1 if indexer.failed else 0
+
+
+def watch(folder: Path, settings: dict):
+    # Qt is only needed to watch
+    from PySide6.QtCore import QCoreApplication, QTimer
+
+    from headless import HeadlessIndexer
+
+    app = QCoreApplication(sys.argv[:1])
+    indexer = HeadlessIndexer(folder, settings, print_throughput)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: indexer.stop())
+    # Python signal handlers only run between Qt events
+    timer = QTimer()
+    timer.timeout.connect(lambda: None)
+    timer.start(500)
+    QTimer.singleShot(0, indexer.start)
+    return app.exec()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="picfinder", description="Index pictures without the GUI"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    index = subparsers.add_parser("index", help="Index a folder")
+    index.add_argument("folder", type=Path)
+    index.add_argument(
+        "--workers",
+        type=int,
+        help="Inference threads, or processes with --backend processes, "
+        "0 for the number of cores",
+    )
+    index.add_argument("--batch-size", type=int)
+    index.add_argument("--prefetch-depth", type=int)
+    index.add_argument("--backend", choices=["threads", "processes"])
+    index.add_argument("--classification-model", help='Model name or "None"')
+    index.add_argument("--detection-model", help='Model name or "None"')
+    index.add_argument("--ocr-model", help='"RapidOCR" or "None"')
+    index.add_argument(
+        "--ocr-gate",
+        action=argparse.BooleanOptionalAction,
+        help="Skip OCR on images without text",
+    )
+    index.add_argument(
+        "--full", action="store_true", help="Index every file again, not only changes"
+    )
+    index.add_argument(
+        "--watch", action="store_true", help="Keep indexing the changes of the folder"
+    )
+    index.add_argument(
+        "--poll",
+        type=int,
+        metavar="SECONDS",
+        help="With --watch, watch by scanning periodically",
+    )
+    index.add_argument("-v", "--verbose", action="store_true", help="Debug logs")
+    args = parser.parse_args(argv)
+    if args.poll is not None and not args.watch:
+        index.error("--poll requires --watch")
+    return args
+
+
+def index_settings(args) -> dict:
+    """
+    Returns the saved settings with the options of args applied.
+    """
+    settings = load_settings()
+    if args.backend is not None:
+        settings["index_backend"] = args.backend
+    if args.workers is not None:
+        if settings["index_backend"] == "processes":
+            settings["process_workers"] = args.workers
+        else:
+            settings["thread_budget"] = args.workers
+    for key, value in (
+        ("batch_size", args.batch_size),
+        ("prefetch_depth", args.prefetch_depth),
+        ("classification_model", args.classification_model),
+        ("object_detection_model", args.detection_model),
+        ("OCR_model", args.ocr_model),
+        ("ocr_gate", args.ocr_gate),
+    ):
+        if value is not None:
+            settings[key] = value
+    settings["FullUpdate"] = args.full
+    if args.poll is not None:
+        settings["watch_polling"] = True
+        settings["watch_poll_interval"] = args.poll
+    return settings
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    folder = args.folder.resolve()
+    if not folder.is_dir():
+        logging.error(f"Invalid folder path {args.folder}")
+        return 2
+
+    settings = index_settings(args)
+    if args.watch:
+        return watch(folder, settings)
+    return index_once(folder, settings)
+
+
+if __name__ == "__main__":
+    freeze_support()
+    sys.exit(main())
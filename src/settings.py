@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+try:
+    from PySide6.QtCore import QSettings
+except ImportError:
+    # the command line indexer runs without Qt
+    QSettings = None
+
+
+class DefaultSettings:
+    """
+    Stands in for QSettings without Qt, every value is its default.
+    """
+
+    def value(self, key: str, default=None, type=None):
+        return default
+
+
+def load_settings():
+    """
+    Returns the saved settings of the application, or their defaults.
+
+    QSettings only needs QtCore, so the settings are also read without a
+    display, by the command line indexer. Without PySide6 the defaults are
+    returned.
+    """
+    if QSettings is None:
+        settings = DefaultSettings()
+    else:
+        settings = QSettings("HAL9000COM", "PicFinder")
+    values = {}
+    values["classification_model"] = settings.value("classification_model", "YOLO11n")
+    values["classification_threshold"] = float(
+        settings.value("classification_threshold", 0.7)
+    )
+    values["object_detection_model"] = settings.value(
+        "object_detection_model", "YOLO11n"
+    )
+    values["object_detection_dataset"] = settings.value(
+        "object_detection_dataset", ["COCO"]
+    )
+    values["object_detection_conf_threshold"] = float(
+        settings.value("object_detection_conf_threshold", 0.7)
+    )
+    values["object_detection_iou_threshold"] = float(
+        settings.value("object_detection_iou_threshold", 0.5)
+    )
+    values["OCR_model"] = settings.value("OCR_model", "RapidOCR")
+    values["ocr_concurrency"] = int(settings.value("ocr_concurrency", 0))
+    values["ocr_gate"] = settings.value("ocr_gate", False, type=bool)
+    values["ocr_gate_sensitivity"] = float(settings.value("ocr_gate_sensitivity", 0.5))
+    values["FullUpdate"] = settings.value("FullUpdate", False, type=bool)
+    values["watch_polling"] = settings.value("watch_polling", False, type=bool)
+    values["watch_poll_interval"] = int(settings.value("watch_poll_interval", 60))
+    values["batch_size"] = int(settings.value("batch_size", 100))
+    values["prefetch_depth"] = int(settings.value("prefetch_depth", 2))
+    values["max_in_flight"] = int(settings.value("max_in_flight", 32))
+    values["reduced_decode"] = settings.value("reduced_decode", True, type=bool)
+    values["index_backend"] = settings.value("index_backend", "threads")
+    values["process_workers"] = int(settings.value("process_workers", 0))
+    values["commit_interval"] = int(settings.value("commit_interval", 1000))
+    hash_algorithm = settings.value("hash_algorithm", "Auto")
+    # None picks the fastest installed algorithm
+    values["hash_algorithm"] = None if hash_algorithm == "Auto" else hash_algorithm
+    values["provider_profile"] = settings.value("provider_profile", "Auto")
+    values["thread_budget"] = int(settings.value("thread_budget", 0))
+    values["intra_op_num_threads"] = int(settings.value("intra_op_num_threads", 0))
+    values["inter_op_num_threads"] = int(settings.value("inter_op_num_threads", 0))
+    values["graph_optimization_level"] = settings.value(
+        "graph_optimization_level", "ORT_ENABLE_ALL"
+    )
+    values["execution_mode"] = settings.value("execution_mode", "ORT_SEQUENTIAL")
+    values["enable_cpu_mem_arena"] = settings.value(
+        "enable_cpu_mem_arena", True, type=bool
+    )
+    values["save_optimized_models"] = settings.value(
+        "save_optimized_models", False, type=bool
+    )
+    values["quantized_models"] = settings.value("quantized_models", True, type=bool)
+    return values